@@ -1,12 +1,49 @@
 import os
-from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtCore import Qt, QSize, QThreadPool
 from PyQt6.QtGui import QFontMetrics
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton, QApplication, QLabel, QFileDialog,
     QSizePolicy, QLineEdit, QHBoxLayout, QFormLayout, QMessageBox,QProgressBar
 )
-
-class BaseFuncWindow(QWidget):
+from core.kai_thread_pool import DataPrefetchWorker
+
+class ExcelPrefetchMixin:
+    """
+    選好試算表就在背景預讀（DataPrefetchWorker），讀取狀態顯示在選擇按鈕上。
+    預讀會把整張表寫進 data_cache，之後的轉換直接從快取取需要的欄位與範圍，
+    不再串流讀檔；沒有預讀（或快取已失效）時才串流讀取。
+    使用的視窗要有 excel_path，按鈕不是 btn_select_excel 時覆寫 excel_button()。
+    """
+    excel_name_limit = None  # 按鈕上檔名最多顯示幾個字，None 表示不限制
+
+    def excel_button(self):
+        return self.btn_select_excel
+
+    def start_excel_prefetch(self, path):
+        self.excel_path = path
+        self.set_excel_button("讀取中… ", path, "")
+
+        worker = DataPrefetchWorker(path)
+        worker.signals.finished.connect(self.excel_prefetch_done)
+        QThreadPool.globalInstance().start(worker)
+
+    def excel_prefetch_done(self, path, success, message):
+        if path != self.excel_path:
+            return  # 使用者已經改選其他檔案
+        if success:
+            self.set_excel_button("Excel: ", path, message)
+        else:
+            self.set_excel_button("讀取失敗: ", path, message)
+            QMessageBox.warning(self, "讀取錯誤", f"試算表讀取失敗：\n{message}")
+
+    def set_excel_button(self, prefix, path, tooltip):
+        filename = os.path.basename(path)[:self.excel_name_limit]
+        button = self.excel_button()
+        button.setText(f"{prefix}{filename}")
+        button.setToolTip(tooltip)
+
+
+class BaseFuncWindow(ExcelPrefetchMixin, QWidget):
     def __init__(self, title):
         super().__init__()
         self.setWindowTitle(title)
@@ -51,9 +88,8 @@ class BaseFuncWindow(QWidget):
     def select_excel_file(self):
         path, _ = QFileDialog.getOpenFileName(self, "選擇 Excel 檔案", "", "Excel 檔案 (*.xls *.xlsx)")
         if path:
-            self.excel_path = path
-            filename = os.path.basename(path)
-            self.btn_select_excel.setText(f"Excel: {filename}")
+            # 選好檔案就在背景解析，等設定完欄位按下轉換時資料已經在快取裡
+            self.start_excel_prefetch(path)
 
     def select_word_file(self):
         path, _ = QFileDialog.getOpenFileName(self, "選擇 Word 模板", "", "Word 文件 (*.docx)")
@@ -1,53 +1,473 @@
 # ✅ conversion_utils.py
 import os
 import re
+import math
+import numpy as np
 import pandas as pd
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.text import WD_LINE_SPACING
 from docx.enum.table import WD_ALIGN_VERTICAL
-from docx.oxml.ns import qn
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml import parse_xml
+from docx.text.paragraph import Paragraph
+from docx.table import Table
 from docx import Document
 from docx.enum.text import WD_BREAK
+from docx.enum.style import WD_STYLE_TYPE
 from copy import deepcopy
+from collections import namedtuple
+from core.data_cache import data_cache
 
 __all__ = [
     "read_data_auto",
+    "iter_data_rows",
+    "count_data_rows",
+    "chunk_rows",
+    "RowValidation",
+    "validate_rows",
+    "frame_to_records",
+    "GOLD_PAPER_KEYS",
+    "expand_goldpaper_frame",
     "col_letter_to_index",
+    "index_to_col_letter",
     "prepare_assign_map",
     "replace_placeholders",
+    "style_placeholder_run",
+    "SizeStyles",
     "save_doc_with_name",
     "write_text_to_cell",
+    "write_text_to_tc",
     "find_placeholders",
     "fill_data_to_table",
     "duplicate_table_and_insert",
+    "TablePageBuilder",
     "extract_placeholders_from_cell",
     "map_all_placeholders",
     "fill_data_to_table_v2",
     "get_dynamic_font_size_func"
     ]
 
-def read_data_auto(filepath):
+def read_data_auto(filepath, use_cache=True):
+    """
+    自動判斷格式讀取試算表（xls / xlsx / html / csv），全部欄位以字串讀入。
+    預設走 data_cache：同一個檔案沒變動時，第二次之後直接取快取結果。
+    只需要部分欄位或部分資料列時，改用 iter_data_rows 串流讀取。
+    """
+    if not use_cache:
+        return _parse_data_file(filepath)
+    try:
+        return data_cache.load(filepath, _parse_data_file)
+    except OSError as e:
+        raise ValueError(f"無法開啟檔案: {e}")
+
+def _read_head(filepath):
     try:
         with open(filepath, 'rb') as f:
-            head = f.read(1024)
+            return f.read(1024)
     except Exception as e:
         raise ValueError(f"無法開啟檔案: {e}")
 
+def _parse_data_file(filepath):
+    head = _read_head(filepath)
+
     try:
         if head.startswith(b'\xD0\xCF\x11\xE0'):
             return pd.read_excel(filepath, dtype=str, engine='xlrd')
         elif head.startswith(b'PK\x03\x04'):
             return pd.read_excel(filepath, dtype=str, engine='openpyxl')
-        elif b'<html' in head.lower() or b'<!doctype' in head.lower():
+        elif _is_html(head):
             return pd.read_html(filepath, encoding='utf-8')[0]
         else:
             return pd.read_csv(filepath, dtype=str, encoding='utf-8')
     except Exception as e:
         raise ValueError(f"讀取檔案失敗: {e}")
 
+def _unique_letters(columns):
+    letters = []
+    for col in columns:
+        col = col.strip().upper()
+        if col and col not in letters:
+            letters.append(col)
+    return letters
+
+# 與 pandas 預設 na_values 相同：這些字串讀進來會被當成空值
+_NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+def _cell_to_str(value):
+    """把單一儲存格的值轉成與 read_data_auto(...).fillna('') 相同的字串。"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ''
+        if value.is_integer():
+            value = int(value)
+    text = str(value)
+    return '' if text in _NA_STRINGS else text
+
+def _is_blank_row(values):
+    return all(v is None or v == '' for v in values)
+
+def _iter_xlsx_values(filepath):
+    from openpyxl import load_workbook
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        # 與 pandas 相同：不信任檔案記錄的範圍，一律從第 1 列開始讀
+        ws.reset_dimensions()
+        for values in ws.iter_rows(values_only=True):
+            yield values
+    finally:
+        wb.close()
+
+def _xls_cell_value(cell, datemode):
+    """
+    .xls 儲存格轉成 Python 值，規則與 pandas 的 xlrd 讀取完全相同，
+    串流讀取與 read_data_auto 轉出的字串才會一致（筆數、快取兩邊都會用到）。
+    """
+    import xlrd
+    value = cell.value
+    if cell.ctype == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        # 落在起始日的日期只有時間部分（例如 12:00），pandas 轉成 time
+        epoch = (1904, 1, 1) if datemode else (1899, 12, 31)
+        if value.timetuple()[0:3] == epoch:
+            value = value.time()
+    elif cell.ctype == xlrd.XL_CELL_ERROR:
+        value = None
+    elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+        value = bool(value)
+    elif cell.ctype == xlrd.XL_CELL_NUMBER:
+        # pandas 的數字一律先轉 float，整數值再轉回 int（1.0 → 1）
+        if math.isfinite(value) and int(value) == value:
+            value = int(value)
+    return value
+
+def _iter_xls_values(filepath):
+    import xlrd
+    book = xlrd.open_workbook(filepath, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for r in range(sheet.nrows):
+            # 與 pandas 相同：每列都補齊到整張表的欄數
+            values = [None] * sheet.ncols
+            for c, cell in enumerate(sheet.row(r)):
+                values[c] = _xls_cell_value(cell, book.datemode)
+            yield values
+    finally:
+        book.release_resources()
+
+def _iter_csv_values(filepath):
+    import csv
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        for values in csv.reader(f):
+            # 與 pandas 相同：完全空白的行直接略過（只有逗號的行則保留）
+            if not values or (len(values) == 1 and not values[0].strip()):
+                continue
+            yield values
+
+def _open_source(filepath, head):
+    """
+    回傳 (逐列原始值的 iterator, 是否要去掉檔尾空白列, 標題列是否去掉尾端空白欄)。
+    Excel 與 pandas 相同：第一列是標題列、中間的空白列保留成空資料、檔尾空白列去掉。
+    """
+    if head.startswith(b'\xD0\xCF\x11\xE0'):
+        return _iter_xls_values(filepath), True, False
+    elif head.startswith(b'PK\x03\x04'):
+        return _iter_xlsx_values(filepath), True, True
+    return _iter_csv_values(filepath), False, True
+
+def _is_html(head):
+    return b'<html' in head.lower() or b'<!doctype' in head.lower()
+
+def _header_width(values, trim=True):
+    width = len(values)
+    while trim and width and (values[width - 1] is None or values[width - 1] == ''):
+        width -= 1
+    return width
+
+def count_data_rows(filepath):
+    """資料筆數（不含標題列），有快取時直接取快取，否則串流計數、不轉換內容。"""
+    cached = data_cache.peek(filepath)
+    if cached is not None:
+        return len(cached)
+    head = _read_head(filepath)
+    if _is_html(head):
+        return len(read_data_auto(filepath))
+    source, trim_trailing, _ = _open_source(filepath, head)
+    total = 0
+    pending_blank = 0
+    try:
+        for row_number, values in enumerate(source):
+            if row_number == 0:
+                continue
+            if trim_trailing and _is_blank_row(values):
+                pending_blank += 1
+                continue
+            total += pending_blank + 1
+            pending_blank = 0
+    finally:
+        source.close()
+    return total
+
+def _iter_frame_rows(df, letters=None, missing_ok=False):
+    """逐列產生 DataFrame 的資料；df 的欄位依位置對應 A、B、C…"""
+    if letters is None:
+        letters = [index_to_col_letter(i) for i in range(len(df.columns))]
+    elif not missing_ok:
+        _check_letters_exist(len(df.columns), letters)
+    positions = [col_letter_to_index(c) for c in letters]
+    yield from _zip_frame_columns(df, positions, letters)
+
+def frame_to_records(df):
+    """DataFrame 轉成 [{欄名: 值}]，比 df.to_dict("records") 快很多（不做型別轉換）。"""
+    columns = list(df.columns)
+    values = [df[c].tolist() for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+def _zip_frame_columns(df, positions, letters):
+    width = len(df.columns)
+    empty = [''] * len(df)
+    columns = [
+        df.iloc[:, pos].fillna('').astype(str).tolist() if pos < width else empty
+        for pos in positions
+    ]
+    for values in zip(*columns):
+        yield dict(zip(letters, values))
+
+def iter_data_rows(filepath, columns=None, missing_ok=False, start=0, stop=None, use_cache=True):
+    """
+    串流讀取試算表：逐列產生 {欄位字母: 字串} 的輕量資料（不含標題列），
+    不會先建立整張 DataFrame，記憶體用量與試算表大小無關。
+    資料序號與 read_data_auto 的 index 一致（Excel 中間的空白列也算一筆）。
+    - 若 data_cache 已有這個檔案的解析結果，直接從快取逐列產生
+    - columns：只保留這些欄位字母；標題列沒有這些欄位時丟出 ValueError，
+      missing_ok=True 時改成補空字串
+    - start / stop：只產生第 start 到 stop-1 筆（從 0 起算），
+      start 之前的列不做轉換，讀到 stop 就停止讀檔
+    """
+    letters = _unique_letters(columns) if columns else None
+
+    if use_cache:
+        cached = data_cache.peek(filepath)
+        if cached is not None:
+            yield from _iter_frame_rows(cached.iloc[start:stop], letters, missing_ok)
+            return
+
+    head = _read_head(filepath)
+    if _is_html(head):
+        # html 表格無法串流，只能整份解析
+        yield from _iter_frame_rows(read_data_auto(filepath).iloc[start:stop], letters, missing_ok)
+        return
+
+    source, trim_trailing, trim_header = _open_source(filepath, head)
+    positions = None
+    width = 0           # 目前讀到最寬的一列；與 pandas 相同，欄數看所有列而不只標題列
+    need_width = 0      # 指定的欄位需要的寬度
+    row_index = 0       # 目前這列的資料序號
+    pending_blank = 0   # 還不確定是不是檔尾的空白列
+    try:
+        for values in source:
+            if positions is None:
+                # 第一列是標題列；尾端空白的標題格只在列出全部欄位時去掉
+                if letters is None:
+                    letters = [index_to_col_letter(i) for i in range(_header_width(values, trim_header))]
+                positions = [col_letter_to_index(c) for c in letters]
+                if not missing_ok and positions:
+                    need_width = max(positions) + 1
+                width = len(values)
+                empty_record = dict.fromkeys(letters, '')
+                continue
+
+            if width < need_width:
+                # 標題列不夠寬（例如合併儲存格只記錄第一格），看資料列有沒有這些欄位
+                width = max(width, len(values))
+
+            if trim_trailing and _is_blank_row(values):
+                pending_blank += 1
+                continue
+
+            # 後面還有資料，先前的空白列都是中間的空白資料
+            for _ in range(pending_blank):
+                if stop is not None and row_index >= stop:
+                    break
+                if row_index >= start:
+                    yield dict(empty_record)
+                row_index += 1
+            pending_blank = 0
+
+            if stop is not None and row_index >= stop:
+                break
+            if row_index >= start:
+                yield {
+                    c: (_cell_to_str(values[pos]) if pos < len(values) else '')
+                    for c, pos in zip(letters, positions)
+                }
+            row_index += 1
+
+        if width < need_width:
+            _check_letters_exist(width, letters)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"讀取檔案失敗: {e}")
+    finally:
+        source.close()
+
+def chunk_rows(rows, columns, chunksize=1000):
+    """
+    把 iter_data_rows 產生的資料每 chunksize 筆包成一個小 DataFrame，
+    index 是資料在試算表中的序號（從 0 起算），方便做向量化的檢查。
+    """
+    letters = _unique_letters(columns)
+    batch = []
+    offset = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunksize:
+            yield _records_to_frame(batch, letters, offset)
+            offset += len(batch)
+            batch = []
+    if batch:
+        yield _records_to_frame(batch, letters, offset)
+
+def _records_to_frame(records, letters, offset=0):
+    df = pd.DataFrame.from_records(records, columns=letters)
+    df.index = pd.RangeIndex(offset, offset + len(records))
+    return df
+
+RowValidation = namedtuple("RowValidation", ["valid_index", "empty_counts", "missing_labels"])
+
+def validate_rows(df, required_cols, label_cols=None):
+    """
+    以布林遮罩一次完成資料檢查（df 的欄名為欄位字母）：
+    - valid_index：必須欄位全部有填寫的列
+    - empty_counts：{欄位字母: 空白筆數}
+    - missing_labels：整份資料都沒有內容的標籤欄位
+    """
+    label_cols = list(label_cols or [])
+    filled = {}
+    for col in _unique_letters(list(required_cols) + label_cols):
+        if col in df.columns:
+            values = df[col]
+            filled[col] = values.notna() & (values.astype(str) != '')
+        else:
+            filled[col] = pd.Series(False, index=df.index)
+
+    valid_mask = pd.Series(True, index=df.index)
+    for col in required_cols:
+        valid_mask &= filled[col.strip().upper()]
+
+    empty_counts = {col: int((~mask).sum()) for col, mask in filled.items()}
+    missing_labels = [col for col in _unique_letters(label_cols) if not filled[col].any()]
+    return RowValidation(df.index[valid_mask.to_numpy()], empty_counts, missing_labels)
+
+GOLD_PAPER_KEYS = list("FGHIJK")
+_GOLD_COUNT_PATTERN = re.compile(r"金紙((?:(?!金紙)[^份])*)", re.DOTALL)
+
+def _parse_gold_count(text):
+    try:
+        return int(text.strip())
+    except (TypeError, ValueError):
+        return 1
+
+def expand_goldpaper_frame(df, gold_keys=None):
+    """
+    金紙封條展開（欄式處理）：
+    每一列依序讀 F–K 欄，遇到空白就停止；
+    內容含「金紙N份」時展開成 N+1 張、F 改成「金紙1份」，其餘內容各一張。
+    B 欄依展開順序加上 -1、-2… 後綴（第一張維持原編號），其他 F–K 欄清空。
+    回傳展開後的 DataFrame，結果與逐列展開完全相同。
+    """
+    gold_keys = list(gold_keys or GOLD_PAPER_KEYS)
+    if "B" not in df.columns:
+        raise ValueError("金紙封條模式需要 B 欄（編號）。")
+
+    row_count = len(df)
+    contents = np.empty((row_count, len(gold_keys)), dtype=object)
+    for j, key in enumerate(gold_keys):
+        if key in df.columns:
+            # 同樣的內容（例如「金紙3份」）大量重複，只對不重複的值做字串處理
+            codes, uniques = pd.factorize(df[key].fillna('').astype(str))
+            stripped = np.array([u.strip() for u in uniques] + [''], dtype=object)
+            contents[:, j] = stripped[codes]
+        else:
+            contents[:, j] = ''
+
+    # 每列從 F 開始，遇到第一個空白欄位就停止
+    active = np.cumprod(contents != '', axis=1).astype(bool)
+    cell_rows, cell_cols = np.nonzero(active)  # 依列、再依欄排序，與逐列處理順序相同
+    cell_codes, cell_uniques = pd.factorize(contents[cell_rows, cell_cols])
+
+    # 解析「金紙N份」的 N（解析失敗當作 1），並算出 F 欄要顯示的內容
+    texts = pd.Series(cell_uniques, dtype=object)
+    uniq_gold = texts.str.contains("金紙", regex=False).to_numpy(dtype=bool)
+    uniq_parsed = np.ones(len(texts), dtype=np.int64)
+    count_text = texts[uniq_gold].str.extract(_GOLD_COUNT_PATTERN, expand=False)
+    uniq_parsed[uniq_gold] = [_parse_gold_count(t) for t in count_text]
+    uniq_f = texts.to_numpy(dtype=object).copy()
+    for pos in np.flatnonzero(uniq_gold):
+        uniq_f[pos] = uniq_f[pos].replace(f"金紙{uniq_parsed[pos]}份", "金紙1份")
+
+    is_gold = uniq_gold[cell_codes]
+    copies = np.where(is_gold, uniq_parsed[cell_codes] + 1, 1)
+
+    # 每個欄位在同一列中的起始序號（前面欄位展開張數的累計）
+    if len(copies):
+        exclusive = np.cumsum(copies) - copies
+        _, first_cell = np.unique(cell_rows, return_index=True)
+        row_start = np.repeat(exclusive[first_cell], np.diff(np.append(first_cell, len(copies))))
+        cell_offset = exclusive - row_start
+    else:
+        cell_offset = np.zeros(0, dtype=np.int64)
+
+    # 展開：每個欄位重複 copies 次
+    repeats = np.clip(copies, 0, None)
+    out_cells = np.repeat(np.arange(len(copies)), repeats)
+    copy_index = np.arange(len(out_cells)) - (np.cumsum(repeats) - repeats)[out_cells]
+    serial = cell_offset[out_cells] + copy_index
+    # 只有每列第一個欄位的第一張維持原編號
+    keep_b = (cell_offset[out_cells] == 0) & (copy_index == 0)
+
+    out = df.iloc[cell_rows[out_cells]].reset_index(drop=True)
+    b_values = out["B"].fillna('').astype(str).to_numpy(dtype=str)
+    serial_codes, serial_uniques = pd.factorize(serial)
+    suffix = np.array([f"-{n}" for n in serial_uniques] or [''], dtype=str)[serial_codes]
+    out["B"] = np.where(keep_b, b_values, np.char.add(b_values, suffix)).astype(object)
+    for key in gold_keys:
+        out[key] = ''
+    out[gold_keys[0]] = uniq_f[cell_codes[out_cells]]
+    return out
+
+def _check_letters_exist(column_count, columns):
+    for col in columns or []:
+        if col_letter_to_index(col) >= column_count:
+            raise ValueError(f"欄位 {col} 不存在於讀取的資料中。")
+
 def col_letter_to_index(letter):
-    return ord(letter.upper()) - ord('A')
+    """欄位字母轉成從 0 開始的索引：A → 0、Z → 25、AA → 26、AB → 27…"""
+    index = 0
+    for ch in letter.strip().upper():
+        if not ('A' <= ch <= 'Z'):
+            raise ValueError(f"欄位 {letter} 不是有效的英文欄位字母。")
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index - 1
+
+def index_to_col_letter(index):
+    """col_letter_to_index 的反向：0 → A、25 → Z、26 → AA…"""
+    letters = ''
+    index += 1
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
 
 
 def prepare_assign_map(replacements, doc):
@@ -58,7 +478,7 @@ def prepare_assign_map(replacements, doc):
     return assign_map
 
 
-def replace_placeholders(doc, assign_map, font_size_rules=None):
+def replace_placeholders(doc, assign_map, font_size_rules=None, size_styles=None):
     if font_size_rules is None:
         font_size_rules = [(8, 22), (20, 18), (9999, 12)]
 
@@ -102,18 +522,28 @@ def replace_placeholders(doc, assign_map, font_size_rules=None):
             for _, _, r_idx in affected[1:]:
                 runs[r_idx].text = ''
 
-            # 設定字體大小及字型
-            length = len(replacement)
-            font_size = Pt(12)
-            for max_len, size_pt in font_size_rules:
-                if length <= max_len:
-                    font_size = Pt(size_pt)
-                    break
+            style_placeholder_run(runs[first_run_idx], replacement, font_size_rules, size_styles)
 
-            run = runs[first_run_idx]
-            run.font.size = font_size
-            run.font.name = '標楷體'
-            run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
+def style_placeholder_run(run, replacement, font_size_rules, size_styles=None):
+    # 設定字體大小及字型：依替換文字長度套用 font_size_rules
+    length = len(replacement)
+    font_size = 12
+    for max_len, size_pt in font_size_rules:
+        if length <= max_len:
+            font_size = size_pt
+            break
+
+    if size_styles is not None:
+        # 樣式模式：改成引用字元樣式，拿掉會蓋過樣式的直接格式
+        r_pr = run._element.get_or_add_rPr()
+        r_pr._remove_rFonts()
+        r_pr._remove_sz()
+        r_pr.style = size_styles.character(font_size)
+        return
+
+    run.font.size = Pt(font_size)
+    run.font.name = '標楷體'
+    run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
 
 def save_doc_with_name(doc, folder, filename):
     os.makedirs(folder, exist_ok=True)
@@ -143,31 +573,139 @@ def map_all_placeholders(table):
     return mapping, max_col
 
 
-def write_text_to_cell(cell, text, font_size=12):
-    cell.text = str(text)
-    para = cell.paragraphs[0] if cell.paragraphs else cell.add_paragraph()
-    run = para.runs[0] if para.runs else para.add_run()
-    # 字型設定
-    run.font.size = Pt(font_size)
-    run.font.name = '標楷體'
-    run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
-    # 段落設定
-    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-    para.paragraph_format.line_spacing = Pt(12)
-    para.paragraph_format.space_before = Pt(0)
-    para.paragraph_format.space_after = Pt(0)
+# 字體大小 → (pPr, rPr) XML 片段；每種大小只用 python-docx 產生一次，之後直接複製
+_CELL_FORMAT_CACHE = {}
+
 
-    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+def _cell_format_fragments(font_size):
+    fragments = _CELL_FORMAT_CACHE.get(font_size)
+    if fragments is None:
+        para = Paragraph(parse_xml(f"<w:p {nsdecls('w')}/>"), None)
+        run = para.add_run()
+        # 字型設定
+        run.font.size = Pt(font_size)
+        run.font.name = '標楷體'
+        run._element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
+        # 段落設定
+        para.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
+        para.paragraph_format.line_spacing = Pt(12)
+        para.paragraph_format.space_before = Pt(0)
+        para.paragraph_format.space_after = Pt(0)
 
+        fragments = (para._p.pPr, run._element.rPr)
+        _CELL_FORMAT_CACHE[font_size] = fragments
+    return fragments
 
 
-def fill_data_to_table_v2(table, placeholder_map, data_batch, start_col, font_size_func=None):
+# 段落樣式 styleId → 只含 <w:pStyle> 的 pPr 片段
+_CELL_STYLE_CACHE = {}
+
+
+def _cell_style_fragment(style_id):
+    fragment = _CELL_STYLE_CACHE.get(style_id)
+    if fragment is None:
+        p = parse_xml(f"<w:p {nsdecls('w')}/>")
+        p.style = style_id
+        fragment = _CELL_STYLE_CACHE[style_id] = p.pPr
+    return fragment
+
+
+def write_text_to_tc(tc, text, font_size=12, style_id=None):
+    """
+    直接操作 <w:tc> 寫入文字：複製預先建好的段落 / 字型 XML，
+    不經過 python-docx 的 cell / paragraph / run 物件，結果與 write_text_to_cell 相同。
+    style_id：樣式模式下的段落樣式（SizeStyles.paragraph），段落與 run 不再帶直接格式。
+    """
+    tc.clear_content()
+    p = tc.add_p()
+    r = p.add_r()
+    r.text = str(text)  # 換行會轉成 <w:br/>
+    if style_id is not None:
+        p.insert(0, deepcopy(_cell_style_fragment(style_id)))
+    else:
+        p_pr, r_pr = _cell_format_fragments(font_size)
+        p.insert(0, deepcopy(p_pr))
+        r.insert(0, deepcopy(r_pr))
+    tc.get_or_add_tcPr().vAlign_val = WD_ALIGN_VERTICAL.CENTER
+
+
+def write_text_to_cell(cell, text, font_size=12, style_id=None):
+    write_text_to_tc(cell._tc, text, font_size, style_id)
+
+
+class SizeStyles:
+    """
+    樣式模式：每個字體大小在文件裡建立一個具名樣式（只建一次），
+    之後段落 / run 只寫一個樣式引用，取代每個 run 都帶字型、大小、段落間距的直接格式，
+    document.xml 小很多，Word 開啟也較快。
+    - character(size)：字元樣式（標楷體 + 大小），給佔位符替換的 run 用
+    - paragraph(size)：段落樣式（表格文字的段落設定 + 標楷體 + 大小），給表格格子用
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._ids = {}  # (樣式類型, 大小) -> styleId
+
+    def character(self, font_size):
+        return self._get(WD_STYLE_TYPE.CHARACTER, font_size)
+
+    def paragraph(self, font_size):
+        return self._get(WD_STYLE_TYPE.PARAGRAPH, font_size)
+
+    @property
+    def count(self):
+        return len(self._ids)
+
+    def _get(self, style_type, font_size):
+        key = (style_type, font_size)
+        style_id = self._ids.get(key)
+        if style_id is None:
+            style_id = self._add_style(style_type, font_size)
+            self._ids[key] = style_id
+        return style_id
+
+    def _add_style(self, style_type, font_size):
+        is_paragraph = style_type == WD_STYLE_TYPE.PARAGRAPH
+        size_text = f"{font_size:g}"
+        name = f"{'表格文字' if is_paragraph else '替換文字'} {size_text}pt"
+        style_id = f"Ex2wd{'Cell' if is_paragraph else 'Run'}{size_text.replace('.', '_')}"
+
+        styles = self.doc.styles
+        if name in styles:
+            # 模板本身已經有（例如用上次的輸出當模板），直接沿用
+            return styles[name].style_id
+
+        style = styles.add_style(name, style_type)
+        style.style_id = style_id
+        style.hidden = False
+        style.quick_style = False
+        # 與直接格式模式相同的字型設定
+        style.font.size = Pt(font_size)
+        style.font.name = '標楷體'
+        style.element.rPr.rFonts.set(qn('w:eastAsia'), '標楷體')
+        if is_paragraph:
+            # 與 _cell_format_fragments 相同的段落設定
+            fmt = style.paragraph_format
+            fmt.alignment = WD_ALIGN_PARAGRAPH.LEFT
+            fmt.line_spacing_rule = WD_LINE_SPACING.EXACTLY
+            fmt.line_spacing = Pt(12)
+            fmt.space_before = Pt(0)
+            fmt.space_after = Pt(0)
+        return style.style_id
+
+
+
+def fill_data_to_table_v2(table, placeholder_map, data_batch, start_col, font_size_func=None, size_styles=None):
     """
     根據 placeholder_map 的最右一欄做為模板欄（e.g., 14），
     從右到左將資料寫入每一欄（最大支援 15 筆）。
     font_size_func: 一個函式，根據每筆資料內容長度決定字體大小。
+    size_styles: SizeStyles，有傳入時格子改用段落樣式（樣式模式）。
     """
+    # table.cell() 每次都會重建整張表的格子清單，這裡只建一次
+    cells = table._cells
+    column_count = table._column_count
     for i, data in enumerate(data_batch):
         col = start_col - i
         if col < 0:
@@ -182,7 +720,8 @@ def fill_data_to_table_v2(table, placeholder_map, data_batch, start_col, font_si
                         )
 
             font_size = font_size_func(val) if font_size_func else 12
-            write_text_to_cell(table.cell(row, col), val, font_size=font_size)
+            style_id = size_styles.paragraph(font_size) if size_styles is not None else None
+            write_text_to_tc(cells[row * column_count + col]._tc, val, font_size=font_size, style_id=style_id)
     return len(data_batch)
 
 def duplicate_table_and_insert(doc, table):
@@ -203,6 +742,40 @@ def duplicate_table_and_insert(doc, table):
     return new_table
 
 
+class TablePageBuilder:
+    """
+    批次文件的分頁組裝（取代逐頁呼叫 duplicate_table_and_insert）：
+    乾淨的模板表格與分頁段落只準備一次，新頁的表格在文件外複製、填好，
+    最後 flush() 一次插入 body（sectPr 之前），結果與逐頁插入相同。
+    """
+
+    def __init__(self, doc, template_table):
+        self.doc = doc
+        self._table_fragment = deepcopy(template_table._tbl)
+        paragraph = Paragraph(parse_xml(f"<w:p {nsdecls('w')}/>"), None)
+        paragraph.add_run().add_break(WD_BREAK.PAGE)
+        self._break_fragment = paragraph._p
+        self._pending = []
+
+    def add_page(self, tbl=None):
+        """新增一頁並回傳它的表格；傳入 tbl 時直接使用（例如沿用上次輸出的表格）。"""
+        if tbl is None:
+            tbl = deepcopy(self._table_fragment)
+        self._pending.append(tbl)
+        return Table(tbl, self.doc._body)
+
+    def flush(self):
+        body = self.doc.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        index = body.index(sect_pr) if sect_pr is not None else len(body)
+        elements = []
+        for tbl in self._pending:
+            elements.append(deepcopy(self._break_fragment))
+            elements.append(tbl)
+        body[index:index] = elements
+        self._pending = []
+
+
 def get_dynamic_font_size_func(size_1, size_2, size_3):
     def font_size_func(text):
         length = len(text.replace("\n", ""))
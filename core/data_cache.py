@@ -0,0 +1,214 @@
+# ✅ data_cache.py
+# 試算表解析結果快取：程序內 LRU + 磁碟上的欄式（columnar）快取檔
+import os
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+__all__ = [
+    "ParsedTableCache",
+    "data_cache",
+    "get_default_cache_dir",
+]
+
+# 快取格式有變動時遞增，舊檔會自動失效
+CACHE_FORMAT_VERSION = 1
+
+
+def get_default_cache_dir():
+    """Windows 放在 %LOCALAPPDATA%，其他系統放在 ~/.cache。"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "qt_project_ex2wd", "data_cache")
+
+
+def _hash_file(filepath, block_size=1024 * 1024):
+    h = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _frame_to_columns(df):
+    # 只存欄名與每欄的 numpy 陣列，不依賴 pandas 內部 pickle 格式
+    return {
+        "columns": list(df.columns),
+        "arrays": [df.iloc[:, i].to_numpy(dtype=object) for i in range(df.shape[1])],
+        "length": len(df),
+    }
+
+
+def _columns_to_frame(payload):
+    df = pd.DataFrame(
+        {i: arr for i, arr in enumerate(payload["arrays"])},
+        index=pd.RangeIndex(payload["length"]),
+    )
+    df.columns = payload["columns"]
+    return df
+
+
+class ParsedTableCache:
+    """
+    以 路徑 + 檔案大小 + 修改時間 + 內容雜湊 為鍵，快取已解析的試算表。
+    - 記憶體：OrderedDict 實作的 LRU，同一個檔案第二次讀取幾乎不花時間
+    - 磁碟：以內容雜湊命名的欄式快取檔，程式重開後仍然有效
+    """
+
+    def __init__(self, cache_dir=None, max_memory_entries=8, max_disk_entries=32):
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()  # (path, size, mtime_ns, variant) -> DataFrame
+        self._lock = threading.Lock()
+        self._inflight = {}  # (path, variant) -> [Lock, 使用中的數量]，同一個檔案同時只解析一次
+
+    def load(self, filepath, parse_func, variant=""):
+        """
+        取得 filepath 的解析結果；沒有快取時呼叫 parse_func(filepath) 並寫入快取。
+        variant 用來區分同一檔案的不同讀法（例如不同參數）。
+        回傳的是副本，呼叫端可以自由修改。
+        """
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        mem_key = (path, stat.st_size, stat.st_mtime_ns, variant)
+
+        df = self._get_memory(mem_key)
+        if df is not None:
+            return df.copy()
+
+        # 背景預讀還在解析同一個檔案時，等它完成後直接用結果，不重複解析
+        with self._inflight_lock(path, variant):
+            df = self._get_memory(mem_key)
+            if df is None:
+                content_hash = _hash_file(path)
+                disk_path = self._disk_path(content_hash, variant)
+
+                df = self._read_disk(disk_path, stat.st_size)
+                if df is None:
+                    df = parse_func(filepath)
+                    self._write_disk(disk_path, df, path, stat, content_hash)
+
+                self._put_memory(mem_key, df)
+        return df.copy()
+
+    def peek(self, filepath, variant=""):
+        """
+        只查快取（記憶體 → 磁碟），沒有就回傳 None，不會觸發解析。
+        若同一個檔案正在背景解析中，會等解析完成再查。
+        """
+        path = os.path.abspath(filepath)
+        try:
+            stat = os.stat(path)
+            mem_key = (path, stat.st_size, stat.st_mtime_ns, variant)
+            df = self._get_memory(mem_key)
+            if df is None:
+                with self._inflight_lock(path, variant):
+                    df = self._get_memory(mem_key)
+                    if df is None:
+                        df = self._read_disk(self._disk_path(_hash_file(path), variant), stat.st_size)
+                        if df is None:
+                            return None
+                        self._put_memory(mem_key, df)
+        except OSError:
+            return None
+        return df.copy()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    @contextmanager
+    def _inflight_lock(self, path, variant):
+        # 最後一個使用者離開時就移除，長時間執行也不會累積每個讀過的檔案
+        key = (path, variant)
+        with self._lock:
+            entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._inflight[key]
+
+    # ---------- 記憶體 LRU ----------
+    def _get_memory(self, key):
+        with self._lock:
+            df = self._memory.get(key)
+            if df is not None:
+                self._memory.move_to_end(key)
+            return df
+
+    def _put_memory(self, key, df):
+        with self._lock:
+            # 同一路徑的舊版本（檔案已被修改）直接丟掉
+            for old_key in [k for k in self._memory if k[0] == key[0] and k[3] == key[3] and k != key]:
+                del self._memory[old_key]
+            self._memory[key] = df
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    # ---------- 磁碟快取 ----------
+    def _disk_path(self, content_hash, variant):
+        variant_hash = hashlib.sha1(str(variant).encode("utf-8")).hexdigest()[:8]
+        filename = f"v{CACHE_FORMAT_VERSION}_{content_hash}_{variant_hash}.pkl"
+        return os.path.join(self.cache_dir, filename)
+
+    def _read_disk(self, disk_path, size):
+        if not os.path.exists(disk_path):
+            return None
+        try:
+            with open(disk_path, "rb") as f:
+                payload = pickle.load(f)
+            if payload.get("size") != size:
+                return None
+            os.utime(disk_path)  # 讓常用的快取檔不會被清掉
+            return _columns_to_frame(payload["table"])
+        except Exception as e:
+            print(f"⚠️ 快取檔讀取失敗，改為重新解析：{e}")
+            return None
+
+    def _write_disk(self, disk_path, df, path, stat, content_hash):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            payload = {
+                "path": path,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "content_hash": content_hash,
+                "table": _frame_to_columns(df),
+            }
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, disk_path)
+            self._prune_disk()
+        except Exception as e:
+            # 快取寫不進去不影響轉換本身
+            print(f"⚠️ 快取檔寫入失敗：{e}")
+
+    def _prune_disk(self):
+        files = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".pkl")
+        ]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for old in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+# 全程式共用同一份快取（各視窗、各 worker 都能命中）
+data_cache = ParsedTableCache()
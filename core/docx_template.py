@@ -0,0 +1,214 @@
+# ✅ docx_template.py
+# 預先編譯的 Word 模板：只解析一次 .docx，之後每筆資料只修補含佔位符的段落
+import io
+import os
+import re
+import csv
+import zipfile
+from copy import deepcopy
+
+from docx import Document
+from docx.text.run import Run
+
+from core.conversion_utils import style_placeholder_run, SizeStyles
+
+__all__ = [
+    "CompiledDocxTemplate",
+    "DocxArchiveWriter",
+]
+
+PLACEHOLDER_PATTERN = re.compile(r"{{\s*([a-zA-Z]+)\s*}}")
+
+
+class CompiledDocxTemplate:
+    """
+    將 Word 模板解析一次，記錄每個 {{X}} 佔位符所在的段落與 run（包含被拆成多個 run 的佔位符）。
+    render() 時只把這些段落換回乾淨的副本再修補，結果與 replace_placeholders 相同，
+    不必每筆資料都重新解壓、解析整份 .docx。
+
+    注意：render() 回傳的是同一份 Document，下一次 render 之前要先存檔。
+
+    存檔用 save() / to_bytes()：模板裡沒變動的 zip 成員（樣式、字型、圖片…）
+    只在建立時壓縮一次，之後每筆只序列化、壓縮 word/document.xml。
+    store_only=True 時全部以不壓縮（stored）方式寫入，檔案較大但更快。
+
+    use_styles=True 時為樣式模式：替換文字的 run 改為引用字元樣式（見 SizeStyles），
+    新增的樣式寫進 styles.xml，底稿 zip 會在樣式增加時重建。
+    """
+
+    def __init__(self, word_path, store_only=False, use_styles=False):
+        self.word_path = word_path
+        self.document = Document(word_path)
+        self.compression = zipfile.ZIP_STORED if store_only else zipfile.ZIP_DEFLATED
+        self.size_styles = SizeStyles(self.document) if use_styles else None
+        self._document_member = self.document.part.partname.membername
+        self._styles_member = self.document.part._styles_part.partname.membername if use_styles else None
+        self._base_style_count = 0
+        self._document_info, self._base_zip = self._build_base_zip()
+        self.placeholders = set()
+        # 每個含佔位符的段落：[目前在文件中的 <w:p>, 乾淨的 <w:p> 副本, 替換步驟]
+        self._slots = []
+
+        for para in self.document.paragraphs:
+            ops = self._compile_paragraph(para)
+            if ops:
+                self._slots.append([para._p, deepcopy(para._p), ops])
+
+    def _build_base_zip(self):
+        # 除了 document.xml 之外的成員原封不動搬進底稿 zip（只壓縮這一次）
+        buffer = io.BytesIO()
+        document_info = None
+        with zipfile.ZipFile(self.word_path) as src, \
+                zipfile.ZipFile(buffer, "w", self.compression) as dst:
+            for info in src.infolist():
+                if info.filename == self._document_member:
+                    document_info = info
+                    continue
+                if info.filename == self._styles_member:
+                    # 樣式模式：styles.xml 用記憶體中（含新增樣式）的版本
+                    dst.writestr(self._copy_info(info), self.document.part._styles_part.blob)
+                    continue
+                dst.writestr(self._copy_info(info), src.read(info.filename))
+        if document_info is None:
+            raise ValueError(f"Word 模板缺少 {self._document_member}")
+        return self._copy_info(document_info), buffer.getvalue()
+
+    def _copy_info(self, info):
+        new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        new_info.compress_type = self.compression
+        new_info.external_attr = info.external_attr
+        return new_info
+
+    def _compile_paragraph(self, para):
+        # 與 replace_placeholders 相同的規則：合併 run 文字，從後往前處理佔位符
+        runs = para.runs
+        if not runs:
+            return []
+
+        full_text = ''
+        run_positions = []  # (start_idx, end_idx, run_idx)
+        for i, run in enumerate(runs):
+            start_idx = len(full_text)
+            full_text += run.text
+            run_positions.append((start_idx, len(full_text), i))
+
+        ops = []  # (key, 第一個 run, 其他要清空的 run)
+        for match in reversed(list(PLACEHOLDER_PATTERN.finditer(full_text))):
+            start, end = match.start(), match.end()
+            affected = [r for r in run_positions if not (r[1] <= start or r[0] >= end)]
+            if not affected:
+                continue
+            key = match.group(1).upper()
+            self.placeholders.add(key)
+            ops.append((key, affected[0][2], [r_idx for _, _, r_idx in affected[1:]]))
+        return ops
+
+    def render(self, assign_map, font_size_rules=None):
+        """依照 assign_map 產生一筆資料的文件（回傳共用的 Document）。"""
+        if font_size_rules is None:
+            font_size_rules = [(8, 22), (20, 18), (9999, 12)]
+
+        for slot in self._slots:
+            current_p, clean_p, ops = slot
+            fresh_p = deepcopy(clean_p)
+            current_p.getparent().replace(current_p, fresh_p)
+            slot[0] = fresh_p
+
+            r_elements = fresh_p.r_lst
+            for key, first_idx, cleared in ops:
+                replacement = assign_map.get(key, '')
+                run = Run(r_elements[first_idx], None)
+                run.text = replacement
+                for r_idx in cleared:
+                    Run(r_elements[r_idx], None).text = ''
+                style_placeholder_run(run, replacement, font_size_rules, self.size_styles)
+
+        return self.document
+
+    def to_bytes(self):
+        """目前 render 結果的 .docx 內容：底稿 zip 再附加 document.xml。"""
+        if self.size_styles is not None and self.size_styles.count != self._base_style_count:
+            # 出現新的字體大小（樣式）時才重建底稿，通常只有前幾筆會發生
+            self._base_style_count = self.size_styles.count
+            self._document_info, self._base_zip = self._build_base_zip()
+        buffer = io.BytesIO(self._base_zip)
+        with zipfile.ZipFile(buffer, "a", self.compression) as zf:
+            zf.writestr(self._document_info, self.document.part.blob)
+        return buffer.getvalue()
+
+    def save(self, output_path):
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(self.to_bytes())
+        return output_path
+
+
+class DocxArchiveWriter:
+    """
+    把產生的 .docx 依序寫進同一個 zip，取代成千上萬個小檔案。
+    每個檔案記錄在 manifest.csv（資料列 → 壓縮檔內檔名），close() 時一併寫入。
+    寫入中的檔案先以 .part 結尾，完成後才改名，中途失敗不會留下看似完整的壓縮檔。
+    """
+
+    MANIFEST_NAME = "manifest.csv"
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self._tmp_path = f"{archive_path}.part"
+        os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+        # .docx 本身已經壓縮過，zip 外層不再壓縮
+        self._zip = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_STORED)
+        self._names = set()
+        self.manifest = []  # (資料列, 檔名)
+
+    def reserve(self, filename):
+        """預留壓縮檔內的檔名；同名時自動加上 (2)、(3)… 避免覆蓋，回傳實際檔名。"""
+        name = filename
+        stem, ext = os.path.splitext(filename)
+        n = 2
+        while name in self._names or name == self.MANIFEST_NAME:
+            name = f"{stem}({n}){ext}"
+            n += 1
+        self._names.add(name)
+        return name
+
+    def write(self, name, data, row_number=""):
+        """寫入已預留檔名的檔案。"""
+        self._zip.writestr(name, data)
+        self.manifest.append((row_number, name))
+
+    def add(self, filename, data, row_number=""):
+        """預留檔名並寫入，回傳實際檔名。"""
+        name = self.reserve(filename)
+        self.write(name, data, row_number)
+        return name
+
+    def close(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["資料列", "檔名"])
+        writer.writerows(self.manifest)
+        # utf-8-sig：用 Excel 開啟 manifest 時中文不會變亂碼
+        self._zip.writestr(self.MANIFEST_NAME, buffer.getvalue().encode("utf-8-sig"))
+        self._zip.close()
+        os.replace(self._tmp_path, self.archive_path)
+        return self.archive_path
+
+    def abort(self):
+        if self._zip.fp is None:
+            return  # 已經關閉
+        self._zip.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,89 @@
+# ✅ export_manifest.py
+# 轉換紀錄：記錄每筆資料（以檔名為鍵）輸出時的內容雜湊，重新執行時跳過已完成且沒變動的檔案
+import os
+import json
+import hashlib
+
+__all__ = [
+    "ExportManifest",
+    "hash_values",
+    "hash_settings",
+]
+
+MANIFEST_VERSION = 1
+
+
+def hash_values(values):
+    """資料內容的雜湊（dict / list 皆可），鍵的順序不影響結果。"""
+    text = json.dumps(values, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def hash_settings(file_paths=(), **settings):
+    """模板檔案內容 + 轉換設定的雜湊；任何一項改變，舊的紀錄就全部失效。"""
+    h = hashlib.sha1()
+    for path in file_paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    h.update(hash_values(settings).encode("ascii"))
+    return h.hexdigest()
+
+
+class ExportManifest:
+    """
+    放在輸出位置旁邊的 JSON 紀錄檔：
+    {"version": 1, "settings": 設定雜湊, "entries": {鍵: 內容雜湊}, "extras": {...}}
+    - 設定雜湊不同（換了模板、字體大小…）時，舊紀錄不採用
+    - mark_done() 每累積 autosave_every 筆自動存檔，中途當掉最多重做這些筆；
+      autosave_every=0 時只在呼叫 save() 時存檔（輸出檔整個完成才算數的情況）
+    - extras：跟著紀錄保存的其他資料（例如 PDF 字型子集的字元順序），同樣只在設定相同時採用
+    """
+
+    def __init__(self, path, settings_hash, autosave_every=50):
+        self.path = path
+        self.settings_hash = settings_hash
+        self.autosave_every = autosave_every
+        self.entries = {}
+        self.extras = {}
+        self._pending = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION and data.get("settings") == self.settings_hash:
+                self.entries = dict(data.get("entries", {}))
+                self.extras = dict(data.get("extras", {}))
+        except Exception as e:
+            # 紀錄檔損壞就當作沒有紀錄，全部重新產生
+            print(f"⚠️ 轉換紀錄讀取失敗，將全部重新產生：{e}")
+
+    def is_done(self, key, content_hash, output_path=None):
+        """這個鍵上次輸出的內容相同，且輸出檔案還在。"""
+        if self.entries.get(key) != content_hash:
+            return False
+        return output_path is None or os.path.exists(output_path)
+
+    def mark_done(self, key, content_hash):
+        self.entries[key] = content_hash
+        self._pending += 1
+        if self.autosave_every and self._pending >= self.autosave_every:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "settings": self.settings_hash,
+            "entries": self.entries,
+            "extras": self.extras,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
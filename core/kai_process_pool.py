@@ -0,0 +1,146 @@
+# ✅ kai_process_pool.py
+# 多行程執行：把資料分批交給多個子行程處理，每個子行程只載入一次模板
+# 注意：這個模組會在子行程中被匯入，不要在這裡匯入 PyQt
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from docx import Document
+
+from core.docx_template import CompiledDocxTemplate
+from core.conversion_utils import (
+    map_all_placeholders,
+    fill_data_to_table_v2,
+    TablePageBuilder,
+    get_dynamic_font_size_func,
+    SizeStyles,
+)
+
+__all__ = [
+    "PROCESS_MIN_ROWS",
+    "default_worker_count",
+    "should_use_processes",
+    "chunked",
+    "process_map",
+    "init_word_renderer",
+    "render_word_chunk",
+    "render_word_chunk_bytes",
+    "build_batch_volume",
+    "init_pdf_renderer",
+    "render_pdf_overlay_chunk",
+]
+
+# 筆數太少時開子行程的成本比省下的時間還多，直接在執行緒裡做
+PROCESS_MIN_ROWS = 200
+
+
+def default_worker_count():
+    # 保留一個核心給介面
+    return max(1, min((os.cpu_count() or 1) - 1, 8))
+
+
+def should_use_processes(total_rows, min_rows=PROCESS_MIN_ROWS):
+    return total_rows >= min_rows and default_worker_count() > 1
+
+
+def chunked(items, size):
+    """把 items 依序切成每批 size 筆的 list。"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def process_map(func, chunks, initializer=None, initargs=(), max_workers=None):
+    """
+    用行程池執行 func(chunk)，依 chunks 的順序逐批產生結果（進度因此是有序的）。
+    中途停止迭代時，尚未開始的批次會被取消。
+    """
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers or default_worker_count(),
+        initializer=initializer,
+        initargs=initargs,
+    )
+    try:
+        yield from executor.map(func, chunks)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# ---------- 召請文：每筆資料一個 .docx ----------
+_word_template = None
+_word_font_size_rules = None
+
+
+def init_word_renderer(word_path, store_only, font_size_rules, use_styles=False):
+    # 每個子行程啟動時執行一次：編譯模板
+    global _word_template, _word_font_size_rules
+    _word_template = CompiledDocxTemplate(word_path, store_only=store_only, use_styles=use_styles)
+    _word_font_size_rules = font_size_rules
+
+
+def render_word_chunk(tasks):
+    """tasks: [(assign_map, output_path), ...]，依序存檔並回傳輸出路徑。"""
+    results = []
+    for assign_map, output_path in tasks:
+        _word_template.render(assign_map, _word_font_size_rules)
+        results.append(_word_template.save(output_path))
+    return results
+
+
+def render_word_chunk_bytes(tasks):
+    """單一壓縮檔模式：只產生 .docx 內容，依序回傳 bytes，由主行程寫進壓縮檔。"""
+    results = []
+    for assign_map, _ in tasks:
+        _word_template.render(assign_map, _word_font_size_rules)
+        results.append(_word_template.to_bytes())
+    return results
+
+
+# ---------- 牌位文疏：分冊產生 ----------
+def build_batch_volume(task):
+    """
+    task: (word_path, font_sizes, pages, output_path, use_styles)
+    pages 是每頁的資料（每頁一個表格），產生一冊 .docx 並回傳寫入的筆數。
+    """
+    word_path, font_sizes, pages, output_path, use_styles = task
+    doc = Document(word_path)
+    if len(doc.tables) == 0:
+        raise ValueError("找不到 Word 表格")
+
+    table = doc.tables[0]
+    # TablePageBuilder 建立時就複製乾淨的表格，之後第 1 頁才填入，不必再多複製一次
+    page_builder = TablePageBuilder(doc, table)
+    placeholder_map, start_col = map_all_placeholders(table)
+    font_size_func = get_dynamic_font_size_func(*font_sizes)
+    size_styles = SizeStyles(doc) if use_styles else None
+
+    for page_index, page in enumerate(pages):
+        current_table = table if page_index == 0 else page_builder.add_page()
+        fill_data_to_table_v2(
+            current_table, placeholder_map, page, start_col,
+            font_size_func=font_size_func, size_styles=size_styles,
+        )
+
+    page_builder.flush()
+    doc.save(output_path)
+    return sum(len(page) for page in pages)
+
+
+# ---------- 金紙封條：PDF 文字頁 ----------
+_pdf_renderer = None
+
+
+def init_pdf_renderer(renderer):
+    # renderer 是不含資料的 PDFExporter（標籤位置已編譯成純資料）；字型要在子行程重新註冊
+    global _pdf_renderer
+    renderer.register_font()
+    _pdf_renderer = renderer
+
+
+def render_pdf_overlay_chunk(pages):
+    """pages: 每頁的資料列；回傳畫好文字的多頁 PDF（bytes），順序與 pages 相同。"""
+    return _pdf_renderer.render_overlay(pages)
@@ -2,18 +2,42 @@ from PyQt6.QtCore import QObject, pyqtSignal, QRunnable
 from docx import Document
 from core.conversion_utils import (
     read_data_auto,
+    iter_data_rows,
+    count_data_rows,
+    chunk_rows,
+    validate_rows,
+    frame_to_records,
+    expand_goldpaper_frame,
     prepare_assign_map,
-    replace_placeholders,
-    save_doc_with_name,
     map_all_placeholders,
     fill_data_to_table_v2,
-    duplicate_table_and_insert
+    TablePageBuilder,
+    SizeStyles,
+    get_dynamic_font_size_func,
+)
+from core.docx_template import CompiledDocxTemplate, DocxArchiveWriter
+from core.export_manifest import ExportManifest, hash_values, hash_settings
+from core.write_behind import WriteBehindQueue
+from core.kai_process_pool import (
+    default_worker_count,
+    should_use_processes,
+    chunked,
+    process_map,
+    init_word_renderer,
+    render_word_chunk,
+    render_word_chunk_bytes,
+    build_batch_volume,
 )
 import os
+import re
+import zipfile
+import pandas as pd
 from copy import deepcopy
 class ExportWorkerSignals(QObject):
     finished = pyqtSignal(bool, str)
     progress = pyqtSignal(int)
+    stage = pyqtSignal(str)  # 目前階段（給按鈕顯示）
+    invalid = pyqtSignal(str, str)  # 資料檢查不通過：(標題, 訊息)
 
 class ExportWorker(QRunnable):
     def __init__(self, exporter, output_path):
@@ -30,11 +54,120 @@ class ExportWorker(QRunnable):
         self.signals.finished.emit(success, result)
 
 
+class GoldPaperExportWorker(ExportWorker):
+    """
+    金紙封條 / 一般模式的 PDF 匯出：
+    讀取試算表、取範圍、金紙展開、標籤欄位檢查都在背景執行，
+    通過檢查後才把資料交給 exporter 產生 PDF。
+    """
+    def __init__(self, exporter, output_path, excel_path, label_ids,
+                 start=0, stop=None, custom_range=False, expand_gold=False):
+        super().__init__(exporter, output_path)
+        self.excel_path = excel_path
+        self.label_ids = label_ids
+        self.start = start
+        self.stop = stop
+        self.custom_range = custom_range
+        self.expand_gold = expand_gold
+
+    def run(self):
+        try:
+            self.signals.stage.emit("處理試算表中...")
+            try:
+                data_list = self.prepare_data()
+            except ValueError as e:
+                self.signals.invalid.emit("警告", f"⚠️ Excel 資料錯誤：{e}")
+                return
+
+            missing_labels = self.find_missing_labels(data_list)
+            if missing_labels:
+                self.signals.invalid.emit(
+                    "資料缺失警告",
+                    f"資料中找不到標籤欄位：{', '.join(missing_labels)}，請檢查 Excel 資料或標籤設定。"
+                )
+                return
+
+            self.signals.stage.emit("轉換pdf中...")
+            self.signals.progress.emit(0)
+            self.exporter.data = data_list
+            super().run()
+
+        except Exception as e:
+            self.signals.finished.emit(False, str(e))
+
+    def prepare_data(self):
+        # 只讀標籤用到的欄位；金紙封條模式另外需要 B（編號）與 F–K（金紙內容）
+        columns = set(self.label_ids)
+        if self.expand_gold:
+            columns |= set("BFGHIJK")
+
+        # 串流讀取 Excel：每一列直接是 {欄位字母: 字串}，只讀範圍內的列
+        # 試算表沒有的欄位補空字串，交給後面的標籤檢查提示使用者
+        try:
+            data_list = list(iter_data_rows(
+                self.excel_path, columns=sorted(columns), missing_ok=True,
+                start=self.start, stop=self.stop,
+            ))
+        except ValueError as e:
+            raise ValueError(f"讀取 Excel 發生錯誤：{e}")
+
+        if self.custom_range and len(data_list) < self.stop - self.start:
+            # 範圍超出資料總筆數
+            total = count_data_rows(self.excel_path)
+            raise ValueError(f"自訂範圍不合法：從 {self.start + 1} 到 {self.stop}，但資料總筆數為 {total}")
+
+        # 如果是金紙封條模式，就展開處理（展開邏輯在 core，欄式處理）
+        if self.expand_gold and data_list:
+            df = pd.DataFrame.from_records(data_list)
+            data_list = frame_to_records(expand_goldpaper_frame(df))
+        return data_list
+
+    def find_missing_labels(self, data_list):
+        # 每個標籤欄位只要有任何一列有值就算存在
+        missing_labels = list(self.label_ids)
+        for chunk in chunk_rows(data_list, self.label_ids, chunksize=10000):
+            missing_labels = validate_rows(chunk, [], missing_labels).missing_labels
+            if not missing_labels:
+                break
+        return missing_labels
+
+
+class DataPrefetchWorkerSignals(QObject):
+    finished = pyqtSignal(str, bool, str)  # (檔案路徑, 成功, 訊息)
+
+class DataPrefetchWorker(QRunnable):
+    """
+    選好試算表後就在背景解析整張表並寫入 data_cache，
+    使用者按下轉換時讀取直接命中快取，不必再等解析。
+    選檔時還不知道會用到哪些欄位，所以快取的是整張表；有快取時 iter_data_rows
+    直接從快取挑欄位與範圍，取代串流讀檔（只讀部分欄位、讀到上限就停的省時效果只在沒有預讀時才有）。
+    """
+    def __init__(self, excel_path):
+        super().__init__()
+        self.signals = DataPrefetchWorkerSignals()
+        self.excel_path = excel_path
+
+    def run(self):
+        try:
+            df = read_data_auto(self.excel_path)
+            if len(df) == 0:
+                raise ValueError("試算表沒有任何資料列。")
+            self.signals.finished.emit(
+                self.excel_path, True, f"共 {len(df)} 筆資料、{df.shape[1]} 個欄位"
+            )
+        except Exception as e:
+            self.signals.finished.emit(self.excel_path, False, str(e))
+
+
 class WordExportWorkerSignals(QObject):
     finished = pyqtSignal(bool, str)
     progress = pyqtSignal(int)
+    progress_max = pyqtSignal(int)  # 實際會寫入的筆數
 
 class WordExportWorker(QRunnable):
+    # 個別檔案模式的轉換紀錄，放在輸出資料夾裡
+    MANIFEST_FILENAME = "轉換紀錄.json"
+
     def __init__(
         self,
         excel_path,
@@ -44,6 +177,11 @@ class WordExportWorker(QRunnable):
         optional_cols,
         font_size_rules,
         limit_rows,
+        store_only=False,
+        use_processes=True,
+        output_mode="files",
+        is_closing_getter=None,  # 傳入一個 func 取得 is_closing 狀態，每筆之間檢查
+        use_styles=False,
     ):
         super().__init__()
         self.signals = WordExportWorkerSignals()
@@ -54,52 +192,236 @@ class WordExportWorker(QRunnable):
         self.optional_cols = optional_cols
         self.font_size_rules = font_size_rules
         self.limit_rows = limit_rows
+        self.store_only = store_only  # True：輸出的 .docx 不壓縮，寫檔較快
+        self.use_processes = use_processes  # False：一律在這個執行緒裡轉換
+        self.output_mode = output_mode  # "files"：每筆一個檔案；"archive"：全部寫進一個 zip
+        self.is_closing_getter = is_closing_getter or (lambda: False)
+        self.use_styles = use_styles  # True：字型大小改用具名樣式，輸出檔較小
 
     def run(self):
         try:
-            df = read_data_auto(self.excel_path).fillna('')
-            if self.limit_rows and isinstance(self.limit_rows, int):
-                df = df.head(self.limit_rows)
-
-            col_letter_map = {chr(65+i): name for i, name in enumerate(df.columns)}
-
-            for col in self.required_cols + self.optional_cols:
-                if col not in col_letter_map:
-                    raise ValueError(f"欄位 {col} 不存在於讀取的資料中。")
-
-            # 預先計算應該會寫出的檔案數（有填寫必填欄位的筆數）
-            valid_rows = [row for idx, row in df.iterrows() if all(str(row[col_letter_map[c]]) for c in self.required_cols)]
-            total_valid = len(valid_rows)
-
-            # 發送進度條最大值
-            self.signals.progress.emit(0)  # 先重置，實際在UI設最大值，這行可以省略看你UI怎寫
-
-            written_count = 0
-            for row in valid_rows:
-                doc = Document(self.word_path)
-                replacements = {c: str(row[col_letter_map[c]]) for c in self.required_cols + self.optional_cols}
-                assign_map = prepare_assign_map(replacements, doc)
-                replace_placeholders(doc, assign_map, self.font_size_rules)
+            # 串流讀取：邊讀邊寫檔，不必先把整張表載入記憶體；讀到筆數上限就停止讀檔
+            rows = iter_data_rows(
+                self.excel_path,
+                columns=self.required_cols + self.optional_cols,
+                stop=self.limit_rows if self.limit_rows and isinstance(self.limit_rows, int) else None,
+            )
+
+            self.signals.progress.emit(0)
+
+            settings_hash = hash_settings(
+                [self.word_path],
+                font_size_rules=self.font_size_rules,
+                store_only=self.store_only,
+                use_styles=self.use_styles,
+            )
+            tasks = list(self._iter_tasks(rows))
+            # 發送進度條最大值：必須欄位都有填寫的筆數（欄位不存在時讀檔就會丟出 ValueError）
+            self.signals.progress_max.emit(len(tasks))
+
+            # 單一壓縮檔模式：全部 .docx 依序寫進一個 zip（附 manifest.csv）
+            if self.output_mode == "archive":
+                archive_path = os.path.join(self.output_folder, "Excel 轉 Word 召請文.zip")
+                # 壓縮檔完成才更新紀錄，中途中止時舊的壓縮檔與紀錄都維持原樣
+                manifest = ExportManifest(f"{archive_path}.{self.MANIFEST_FILENAME}", settings_hash, autosave_every=0)
+                completed, skipped = self._export_archive(tasks, archive_path, manifest)
+                if not completed:
+                    self.signals.finished.emit(False, "使用者中止轉換")
+                    return
+                manifest.save()
+                message = f"轉換完成！\n\n已輸出：{archive_path}"
 
-                c_val = str(row[col_letter_map[self.required_cols[0]]])[:11]
-                filename = f"{c_val}_召請文.docx"
+            # 個別檔案模式：依轉換紀錄跳過已完成且沒變動的檔案，中止後重新執行會接著做
+            else:
                 folder_name = os.path.join(self.output_folder, "Excel 轉 Word 召請文")
-                save_doc_with_name(doc, folder_name, filename)
-
-                written_count += 1
-                self.signals.progress.emit(written_count)
+                os.makedirs(folder_name, exist_ok=True)
+                manifest = ExportManifest(os.path.join(folder_name, self.MANIFEST_FILENAME), settings_hash)
+                try:
+                    completed, skipped = self._export_files(tasks, folder_name, manifest)
+                finally:
+                    manifest.save()
+                if not completed:
+                    self.signals.finished.emit(False, "使用者中止轉換（已完成的檔案下次執行會自動跳過）")
+                    return
+                message = "轉換完成！"
 
-            self.signals.finished.emit(True, "轉換完成！")
+            if skipped:
+                message += f"\n\n其中 {skipped} 筆沒有變動，沿用既有檔案。"
+            self.signals.finished.emit(True, message)
 
         except Exception as e:
             self.signals.finished.emit(False, str(e))
 
-
+    def _iter_tasks(self, rows):
+        # 每筆有效資料轉成 (試算表列號, assign_map, 檔名)
+        for row_number, row in self._iter_valid_rows(rows):
+            replacements = {c: row[c] for c in self.required_cols + self.optional_cols}
+            assign_map = prepare_assign_map(replacements, None)
+
+            c_val = row[self.required_cols[0]][:11]
+            filename = f"{c_val}_召請文.docx"
+            yield row_number, assign_map, filename
+
+    def _iter_rendered(self, pending, to_bytes=False, writer=None):
+        """
+        依序產生 pending [(assign_map, 輸出路徑)] 每筆的結果：
+        to_bytes 時為 .docx 內容，否則存檔並產生輸出路徑。
+        筆數多時分批交給多個子行程（各自存檔）；筆數少時直接在這個執行緒裡做，
+        有 writer 時存檔交給寫檔執行緒，這裡繼續產生下一筆。
+        """
+        if not pending:
+            return
+
+        if self.use_processes and should_use_processes(len(pending)):
+            workers = default_worker_count()
+            chunk_size = max(1, min(50, len(pending) // (workers * 4)))
+            results = process_map(
+                render_word_chunk_bytes if to_bytes else render_word_chunk,
+                chunked(pending, chunk_size),
+                initializer=init_word_renderer,
+                initargs=(self.word_path, self.store_only, self.font_size_rules, self.use_styles),
+                max_workers=workers,
+            )
+            try:
+                for chunk_result in results:
+                    yield from chunk_result
+            finally:
+                # 使用者中止時，尚未開始的批次一併取消
+                results.close()
+            return
+
+        # 模板只解析一次，每筆資料只修補含佔位符的段落
+        # 存檔時模板中沒變動的部分直接沿用，只重新壓縮 document.xml
+        template = CompiledDocxTemplate(self.word_path, store_only=self.store_only, use_styles=self.use_styles)
+        for assign_map, output_path in pending:
+            template.render(assign_map, self.font_size_rules)
+            if to_bytes:
+                yield template.to_bytes()
+            elif writer is not None:
+                writer.write_file(output_path, template.to_bytes())
+                yield output_path
+            else:
+                yield template.save(output_path)
+
+    def _export_files(self, tasks, folder_name, manifest):
+        """回傳 (是否完成, 沿用既有檔案的筆數)。"""
+        # 同名檔案依序寫入時是最後一筆留下，所以只需要產生每個檔名的最後一筆
+        last_index = {filename: i for i, (_, _, filename) in enumerate(tasks)}
+        skipped = 0
+        pending = []  # (assign_map, 輸出路徑)
+        pending_keys = []  # (檔名, 內容雜湊)
+        for i, (_, assign_map, filename) in enumerate(tasks):
+            if last_index[filename] != i:
+                continue
+            output_path = os.path.join(folder_name, filename)
+            content_hash = hash_values(assign_map)
+            if manifest.is_done(filename, content_hash, output_path):
+                skipped += 1
+                continue
+            pending.append((assign_map, output_path))
+            pending_keys.append((filename, content_hash))
+
+        # 被同名檔案取代的、沿用既有檔案的，都直接算進度
+        done_count = len(tasks) - len(pending)
+        self.signals.progress.emit(done_count)
+
+        # 轉換紀錄也交給寫檔執行緒，排在該檔案寫入之後，檔案真的寫好才算完成
+        # 中止時已產生的檔案會寫完；發生錯誤時其餘的寫入放棄
+        with WriteBehindQueue() as writer:
+            rendered = self._iter_rendered(pending, writer=writer)
+            try:
+                for (filename, content_hash), _ in zip(pending_keys, rendered):
+                    writer.submit(manifest.mark_done, filename, content_hash)
+                    done_count += 1
+                    self.signals.progress.emit(done_count)
+                    if self.is_closing_getter():
+                        return False, skipped
+            finally:
+                rendered.close()
+        return True, skipped
+
+    def _export_archive(self, tasks, archive_path, manifest):
+        """
+        全部寫進壓縮檔，回傳 (是否完成, 沿用舊壓縮檔內容的筆數)。
+        內容沒變動的檔案直接從上一次的壓縮檔複製，不重新產生。
+        """
+        old_archive = None
+        if manifest.entries and os.path.exists(archive_path):
+            try:
+                old_archive = zipfile.ZipFile(archive_path)
+            except zipfile.BadZipFile:
+                old_archive = None
+        old_names = set(old_archive.namelist()) if old_archive else set()
+        old_entries, manifest.entries = manifest.entries, {}
+
+        archive = DocxArchiveWriter(archive_path)
+        try:
+            plan = []  # (試算表列號, 壓縮檔內檔名, 內容雜湊, 是否沿用)
+            pending = []
+            for row_number, assign_map, filename in tasks:
+                name = archive.reserve(filename)
+                content_hash = hash_values(assign_map)
+                reuse = name in old_names and old_entries.get(name) == content_hash
+                plan.append((row_number, name, content_hash, reuse))
+                if not reuse:
+                    pending.append((assign_map, None))
+
+            skipped = 0
+            cancelled = False
+            # 壓縮檔只由寫檔執行緒寫入，這裡繼續產生下一筆
+            with WriteBehindQueue() as writer:
+                rendered = self._iter_rendered(pending, to_bytes=True)
+                try:
+                    for done_count, (row_number, name, content_hash, reuse) in enumerate(plan, start=1):
+                        if self.is_closing_getter():
+                            cancelled = True
+                            break
+                        if reuse:
+                            data = old_archive.read(name)
+                            skipped += 1
+                        else:
+                            data = next(rendered)
+                        writer.submit(archive.write, name, data, row_number)
+                        manifest.mark_done(name, content_hash)
+                        self.signals.progress.emit(done_count)
+                finally:
+                    rendered.close()
+
+            if cancelled:
+                archive.abort()
+                return False, skipped
+
+            if old_archive:
+                old_archive.close()
+                old_archive = None
+            archive.close()
+            return True, skipped
+
+        except Exception:
+            archive.abort()
+            raise
+        finally:
+            if old_archive:
+                old_archive.close()
+
+    def _iter_valid_rows(self, rows):
+        # 分批用布林遮罩挑出必填欄位都有填寫的資料，連同試算表列號（第 1 列是標題）
+        for chunk in chunk_rows(rows, self.required_cols + self.optional_cols):
+            report = validate_rows(chunk, self.required_cols)
+            valid = chunk.loc[report.valid_index]
+            yield from zip((valid.index + 2).tolist(), frame_to_records(valid))
+
+
+
+
+# 分冊輸出的檔名：牌位文疏批次生成_01.docx、_02.docx…
+VOLUME_FILENAME_PATTERN = re.compile(r"牌位文疏批次生成_\d+\.docx")
 
 
 class WordBatchExportWorkerSignals(QObject):
     finished = pyqtSignal(bool, str)  # (成功, 訊息)
     progress = pyqtSignal(int)  # 進度值
+    progress_max = pyqtSignal(int)  # 進度條最大值（實際會寫入的筆數）
 
 class WordBatchExportWorker(QRunnable):
     def __init__(
@@ -111,7 +433,9 @@ class WordBatchExportWorker(QRunnable):
         optional_cols,
         limit_rows,
         is_closing_getter,  # 傳入一個 func 取得 is_closing 狀態
-        get_font_size_func,
+        font_sizes,  # (6字以內, 7~15字, 16字以上) 的字體大小，在 UI 執行緒先讀好
+        pages_per_volume=None,  # 每冊頁數；None 表示全部輸出成一個檔案
+        use_styles=False,  # True：格子改用具名段落樣式，輸出檔較小
     ):
         super().__init__()
         self.signals = WordBatchExportWorkerSignals()
@@ -122,21 +446,18 @@ class WordBatchExportWorker(QRunnable):
         self.optional_cols = optional_cols
         self.limit_rows = limit_rows
         self.is_closing_getter = is_closing_getter
-        self.get_font_size_func = get_font_size_func
+        self.font_sizes = tuple(font_sizes)
+        self.pages_per_volume = pages_per_volume
+        self.use_styles = use_styles
 
     def run(self):
         try:
-            df = read_data_auto(self.excel_path).fillna('')
-            if self.limit_rows and isinstance(self.limit_rows, int):
-                df = df.head(self.limit_rows)
+            rows = iter_data_rows(
+                self.excel_path,
+                columns=self.required_cols + self.optional_cols,
+                stop=self.limit_rows if self.limit_rows and isinstance(self.limit_rows, int) else None,
+            )
 
-            col_letter_map = {chr(65+i): name for i, name in enumerate(df.columns)}
-
-            for col in self.required_cols + self.optional_cols:
-                if col not in col_letter_map:
-                    raise ValueError(f"欄位 {col} 不存在於讀取的資料中。")
-
-            total_rows = len(df)
             doc = Document(self.word_path)
             if len(doc.tables) == 0:
                 raise ValueError("找不到 Word 表格")
@@ -147,34 +468,72 @@ class WordBatchExportWorker(QRunnable):
             col_count = start_col + 1
 
             all_data = []
-            for idx, row in df.iterrows():
+            for chunk in chunk_rows(rows, self.required_cols + self.optional_cols):
                 if self.is_closing_getter():
                     self.signals.progress.emit(0)
                     self.signals.finished.emit(False, "使用者中止轉換")
                     return
 
-                if not all(str(row[col_letter_map[c]]) for c in self.required_cols):
-                    continue
+                report = validate_rows(chunk, self.required_cols)
+                all_data.extend(frame_to_records(chunk.loc[report.valid_index]))
 
-                replacements = {c: str(row[col_letter_map[c]]) for c in self.required_cols + self.optional_cols}
-                all_data.append(replacements)
+            # 進度以實際會寫入的筆數（必須欄位都有填寫）為準
+            self.signals.progress_max.emit(len(all_data))
 
-            font_size_func = self.get_font_size_func()
+            font_size_func = get_dynamic_font_size_func(*self.font_sizes)
+            out_path = os.path.join(self.output_folder, "牌位文疏批次生成.docx")
 
+            # 每一頁（一個表格）的內容雜湊；和上次輸出相同的頁面直接沿用舊檔裡的表格
+            pages = [all_data[i:i + col_count] for i in range(0, len(all_data), col_count)]
+            page_hashes = [hash_values(page) for page in pages]
+            manifest = ExportManifest(
+                f"{out_path}.{WordExportWorker.MANIFEST_FILENAME}",
+                hash_settings([self.word_path], font_sizes=list(self.font_sizes), use_styles=self.use_styles),
+                autosave_every=0,
+            )
+            # 分冊：每冊 pages_per_volume 頁，各冊在不同子行程同時產生
+            if self.pages_per_volume:
+                self._export_volumes(pages, page_hashes, len(all_data))
+                return
+
+            old_pages = self._load_old_pages(out_path, manifest)
+            reusable = [
+                i < len(old_pages) and manifest.entries.get(str(i)) == page_hash
+                for i, page_hash in enumerate(page_hashes)
+            ]
+            if pages and all(reusable) and len(pages) == len(old_pages):
+                self.signals.progress.emit(len(all_data))
+                self.signals.finished.emit(True, "資料沒有變動，沿用既有檔案。")
+                return
+
+            # 樣式模式：三種字體大小的樣式先建好，沿用的舊頁面引用的樣式也才會存在
+            size_styles = None
+            if self.use_styles:
+                size_styles = SizeStyles(doc)
+                for size in self.font_sizes:
+                    size_styles.paragraph(size)
+
+            # 第 1 頁就是模板原本的表格；之後的頁面在文件外填好，最後一次插入
+            page_builder = TablePageBuilder(doc, clean_template_table)
             batch_start = 0
-            current_table = table
-            while batch_start < len(all_data):
-                remaining = len(all_data) - batch_start
-                fill_count = min(col_count, remaining)
-
-                current_batch = all_data[batch_start:batch_start + fill_count]
-                written = fill_data_to_table_v2(
-                    current_table,
-                    placeholder_map,
-                    current_batch,
-                    start_col,
-                    font_size_func=font_size_func
-                )
+            for page_index, current_batch in enumerate(pages):
+                if reusable[page_index]:
+                    old_tbl = deepcopy(old_pages[page_index]._tbl)
+                    if page_index == 0:
+                        table._tbl.getparent().replace(table._tbl, old_tbl)
+                    else:
+                        page_builder.add_page(old_tbl)
+                    written = len(current_batch)
+                else:
+                    current_table = table if page_index == 0 else page_builder.add_page()
+                    written = fill_data_to_table_v2(
+                        current_table,
+                        placeholder_map,
+                        current_batch,
+                        start_col,
+                        font_size_func=font_size_func,
+                        size_styles=size_styles,
+                    )
 
                 if written == 0:
                     raise RuntimeError(
@@ -186,13 +545,110 @@ class WordBatchExportWorker(QRunnable):
                 batch_start += written
                 self.signals.progress.emit(batch_start)
 
-                if batch_start < len(all_data):
-                    current_table = duplicate_table_and_insert(doc, clean_template_table)
+                if self.is_closing_getter():
+                    self.signals.finished.emit(False, "使用者中止轉換")
+                    return
 
-            out_path = os.path.join(self.output_folder, "牌位文疏批次生成.docx")
+            page_builder.flush()
             doc.save(out_path)
+            manifest.entries = {str(i): page_hash for i, page_hash in enumerate(page_hashes)}
+            manifest.save()
 
-            self.signals.finished.emit(True, "轉換完成！")
+            reused = sum(reusable)
+            message = "轉換完成！"
+            if reused:
+                message += f"\n\n其中 {reused} 頁沒有變動，沿用既有內容。"
+            self.signals.finished.emit(True, message)
 
         except Exception as e:
-            self.signals.finished.emit(False, f"轉換失敗：{str(e)}")
\ No newline at end of file
+            self.signals.finished.emit(False, f"轉換失敗：{str(e)}")
+
+    def _export_volumes(self, pages, page_hashes, total_rows):
+        n = self.pages_per_volume
+        volumes = [pages[i:i + n] for i in range(0, len(pages), n)]
+        volume_hashes = [hash_values(page_hashes[i:i + n]) for i in range(0, len(pages), n)]
+        width = max(2, len(str(len(volumes))))
+        names = [f"牌位文疏批次生成_{k + 1:0{width}d}.docx" for k in range(len(volumes))]
+
+        # 分冊的轉換紀錄：冊名 → 該冊內容雜湊；沒變動且檔案還在的冊直接沿用
+        manifest = ExportManifest(
+            os.path.join(self.output_folder, f"牌位文疏批次生成_分冊.{WordExportWorker.MANIFEST_FILENAME}"),
+            hash_settings(
+                [self.word_path],
+                font_sizes=list(self.font_sizes),
+                pages_per_volume=n,
+                use_styles=self.use_styles,
+            ),
+            autosave_every=0,
+        )
+        old_entries, manifest.entries = manifest.entries, {}
+        self._remove_stale_volumes(names)
+
+        done_rows = 0
+        skipped = 0
+        tasks = []
+        task_keys = []  # (冊名, 內容雜湊, 筆數)
+        for name, volume, volume_hash in zip(names, volumes, volume_hashes):
+            out_path = os.path.join(self.output_folder, name)
+            rows = sum(len(page) for page in volume)
+            if old_entries.get(name) == volume_hash and os.path.exists(out_path):
+                manifest.entries[name] = volume_hash
+                done_rows += rows
+                skipped += 1
+                continue
+            tasks.append((self.word_path, self.font_sizes, volume, out_path, self.use_styles))
+            task_keys.append((name, volume_hash, rows))
+        self.signals.progress.emit(done_rows)
+
+        # 要產生的冊數不只一冊且有多個核心時才開子行程
+        workers = min(default_worker_count(), len(tasks))
+        if workers > 1:
+            results = process_map(build_batch_volume, tasks, max_workers=workers)
+        else:
+            results = (build_batch_volume(task) for task in tasks)
+        try:
+            for (name, volume_hash, rows), _ in zip(task_keys, results):
+                # 每完成一冊就更新紀錄，中止後重新執行只做剩下的冊
+                manifest.entries[name] = volume_hash
+                manifest.save()
+                done_rows += rows
+                self.signals.progress.emit(done_rows)
+                if self.is_closing_getter():
+                    self.signals.finished.emit(False, "使用者中止轉換（已完成的冊下次執行會自動跳過）")
+                    return
+        finally:
+            results.close()
+
+        manifest.save()
+
+        message = f"轉換完成！共 {len(volumes)} 冊。"
+        if skipped:
+            message += f"\n\n其中 {skipped} 冊沒有變動，沿用既有檔案。"
+        self.signals.finished.emit(True, message)
+
+    def _remove_stale_volumes(self, names):
+        """
+        刪掉輸出資料夾裡不屬於這次分冊的舊冊（例如上次每冊頁數較少、冊數較多）。
+        直接看資料夾內的檔名，不依賴轉換紀錄：設定改變時舊紀錄不會被採用。
+        """
+        keep = set(names)
+        for filename in os.listdir(self.output_folder):
+            if VOLUME_FILENAME_PATTERN.fullmatch(filename) and filename not in keep:
+                os.remove(os.path.join(self.output_folder, filename))
+
+    def _load_old_pages(self, out_path, manifest):
+        """
+        上次輸出的各頁表格（依頁序）。第 1 頁是模板原本的表格，
+        之後每頁都接在文件最後，所以取最後 (頁數 - 1) 個表格。
+        """
+        page_count = len(manifest.entries)
+        if not page_count or not os.path.exists(out_path):
+            return []
+        try:
+            tables = Document(out_path).tables
+        except Exception as e:
+            print(f"⚠️ 無法讀取上次的輸出檔，全部重新產生：{e}")
+            return []
+        if len(tables) < page_count:
+            return []
+        return [tables[0]] + tables[len(tables) - (page_count - 1):] if page_count > 1 else [tables[0]]
\ No newline at end of file
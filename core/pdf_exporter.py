@@ -1,184 +1,370 @@
 import os,re
 from io import BytesIO
-from collections import defaultdict
+import pypdf
+from copy import copy
+from collections import defaultdict, namedtuple
+from functools import lru_cache
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from pypdf import PdfReader, PdfWriter, PageObject
-from PyQt6.QtCore import QPointF
-from PyQt6.QtWidgets import QMessageBox
+from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, NameObject, StreamObject
+from core.export_manifest import ExportManifest, hash_values, hash_settings
+from core.kai_process_pool import (
+    default_worker_count,
+    should_use_processes,
+    chunked,
+    process_map,
+    init_pdf_renderer,
+    render_pdf_overlay_chunk,
+)
+
+# 編譯後的標籤：slots[i] 是第 i 格（切割後的每一塊）的 PDF 座標 (x, y)
+LabelPlan = namedtuple("LabelPlan", ["label_id", "slots", "font_size", "direction", "wrap_limit"])
+
+
+@lru_cache(maxsize=None)
+def _once_pattern(keyword):
+    return re.compile(f"(.*?){re.escape(keyword)}(.*)")
+
+
+@lru_cache(maxsize=None)
+def _split_pattern(keyword):
+    # 保留關鍵詞在句尾：在關鍵詞之後切開（lookbehind）
+    return re.compile(f"(?<={re.escape(keyword)})")
+
+
+@lru_cache(maxsize=4096)
+def break_lines(text, wrap_limit, once_keywords=(), split_keywords=(), remove_words=(), replacements=()):
+    """
+    標籤文字斷行：先做文字替換、刪除詞，再依關鍵詞分段，最後依 wrap_limit 字數切行，回傳 tuple。
+    - once_keywords：只處理第一個出現的（例如「金紙」），關鍵詞前後分成兩段
+    - split_keywords：可多次出現（例如「店」），每次出現都在關鍵詞之後斷開
+    金紙展開後同樣的文字會出現很多次，結果以 LRU 快取，參數都必須是可雜湊的 tuple。
+    """
+    # 🔧 先做文字替換（特殊關鍵詞處理）
+    for old, new in replacements:
+        text = text.replace(old, new)
+    for w in remove_words:
+        text = text.replace(w, "")
+
+    # 🔶 一次性關鍵詞：第一個找到的就處理，結束
+    segments = []
+    remaining = text
+    for keyword in once_keywords:
+        match = _once_pattern(keyword).search(remaining)
+        if match:
+            before = match.group(1)
+            if before.strip():
+                segments.append(before)
+            segments.append(keyword + match.group(2))
+            remaining = ""
+            break
+    if remaining:
+        segments.append(remaining)
+
+    # 🔶 再處理可多次出現的關鍵詞（保留關鍵詞在句尾）
+    new_segments = []
+    for seg in segments:
+        parts = [seg]
+        for kw in split_keywords:
+            pattern = _split_pattern(kw)
+            parts = [s for part in parts for s in pattern.split(part) if s]  # 去除空段
+        new_segments.extend(parts)
+
+    # 🔶 wrap_limit 分段
+    lines = []
+    for seg in new_segments:
+        seg = seg.strip()
+        for i in range(0, len(seg), wrap_limit):
+            lines.append(seg[i:i + wrap_limit])
+    return tuple(lines)
+
+
+def _text_code(text_object):
+    """
+    文字物件已產生的內容（reportlab 內部的 _code 清單），用來快取、重複使用文字片段。
+    reportlab 沒有公開這個介面；找不到時回傳 None，呼叫端改成每次完整產生。
+    """
+    code = getattr(text_object, "_code", None)
+    return code if isinstance(code, list) else None
+
+
+# pypdf 沒有公開「加入新建立的物件」的方法，共用模板只能用 PdfWriter._add_object；
+# 只在確認過的版本（3.x–5.x）啟用，其他版本改用逐頁合併模板
+SHARED_TEMPLATE_SUPPORTED = (
+    hasattr(PdfWriter, "_add_object") and 3 <= int(pypdf.__version__.split(".")[0]) <= 5
+)
+
+
+def _add_pdf_object(writer, obj):
+    """把新建立的物件（模板 XObject 等）加進輸出檔，回傳參照。"""
+    return writer._add_object(obj)
+
+
 class PDFExporter:
+    # 轉換紀錄檔放在輸出 PDF 旁邊：output.pdf → output.pdf.轉換紀錄.json
+    MANIFEST_SUFFIX = ".轉換紀錄.json"
+    # 共用模板在每頁資源裡的名稱
+    TEMPLATE_XOBJECT_NAME = "/ExTemplate"
+    # 要重新產生的頁數達到這個數量才分給多個子行程
+    PROCESS_MIN_PAGES = 100
+    # 斷行關鍵詞的預設值（見 break_lines），可在建立時傳入自訂清單
+    ONCE_KEYWORDS = ("金紙",)
+    SPLIT_KEYWORDS = ("營業所", "店", "公司")
+    REMOVE_WORDS = ("其他",)
+    REPLACEMENTS = (("氏九玄七祖", "氏 九玄七祖"),)
+
     def __init__(self, pdf_path, labels, image_width, image_height,
                  h_count, v_count, font_path, data, compute_offset_func,
-                 label_param_settings=None):
+                 label_param_settings=None, shared_template=True, use_processes=True,
+                 once_keywords=None, split_keywords=None, remove_words=None, replacements=None):
         self.pdf_path = pdf_path
-        self.labels = labels
         self.image_width = image_width
         self.image_height = image_height
         self.h_count = h_count
         self.v_count = v_count
         self.font_path = font_path
         self.data = data
-        self.compute_offset_func = compute_offset_func
         self.label_param_settings = label_param_settings or {}
+        # True：模板頁只放進輸出檔一次（form XObject），每頁只引用它再加上文字；
+        # False：每頁都把模板內容合併一份（舊做法）
+        self.shared_template = shared_template and SHARED_TEMPLATE_SUPPORTED
+        if shared_template and not SHARED_TEMPLATE_SUPPORTED:
+            print(f"⚠️ 目前的 pypdf {pypdf.__version__} 不支援共用模板，改為每頁合併模板")
+        self.use_processes = use_processes  # False：一律在目前的執行緒裡產生
+        # 斷行設定：轉成 tuple 才能當快取的鍵；replacements 可傳 dict 或 (舊, 新) 清單
+        self.once_keywords = tuple(once_keywords) if once_keywords is not None else self.ONCE_KEYWORDS
+        self.split_keywords = tuple(split_keywords) if split_keywords is not None else self.SPLIT_KEYWORDS
+        self.remove_words = tuple(remove_words) if remove_words is not None else self.REMOVE_WORDS
+        if isinstance(replacements, dict):
+            replacements = replacements.items()
+        self.replacements = tuple(map(tuple, replacements)) if replacements is not None else self.REPLACEMENTS
+
+        # 標籤位置在建立 exporter 時（GUI 執行緒）就換算好，之後匯出不再讀取 Qt 物件
+        self.page_size = None
+        self.render_plan = self.compile_render_plan(labels, compute_offset_func)
+        self.label_ids = list(dict.fromkeys(label.label_id for label in self.render_plan))
 
         self.font_name = "Iansui"
-        if os.path.exists(font_path):
-            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        self.register_font()
+        self._text_fragments = {}
+        self.glyph_order = ""  # 字型子集的字元順序，export 時決定（見 prime_font）
+
+    def register_font(self):
+        # 子行程裡也要註冊一次（reportlab 的字型登錄是每個行程各自一份）
+        if os.path.exists(self.font_path):
+            pdfmetrics.registerFont(TTFont(self.font_name, self.font_path))
+
+    def new_canvas(self, packet):
+        # 文字片段快取只對同一個 canvas 有效（字型子集的編碼屬於該份文件）
+        self._text_fragments = {}
+        c = canvas.Canvas(packet, pagesize=self.page_size)
+        self.prime_font(c)
+        return c
+
+    def prime_font(self, c):
+        """
+        第 1 頁先用隱形文字依 glyph_order 畫過所有字元，字型子集的編碼就只由 glyph_order 決定：
+        每個子行程、每次重新輸出（字元只往後加）畫出的字碼都相同，全部頁面可以共用同一份字型。
+        這一頁只用來決定編碼，不放進輸出檔（見 rendered_pages）。
+        """
+        if self.glyph_order and self.font_name in pdfmetrics.getRegisteredFontNames():
+            text_object = c.beginText(0, 0)
+            text_object.setTextRenderMode(3)  # 不可見
+            text_object.setFont(self.font_name, 1)
+            text_object.textOut(self.glyph_order)
+            c.drawText(text_object)
+        c.showPage()
+
+    @staticmethod
+    def rendered_pages(pdf_bytes):
+        """解析 new_canvas 畫出的 PDF，去掉 prime_font 的第 1 頁。"""
+        return PdfReader(BytesIO(pdf_bytes)).pages[1:]
+
+    def collect_glyph_order(self, old_order=""):
+        """
+        這次會用到的字元：沿用上次的順序，新字元依字碼排在後面。
+        只往後加，上次畫好的頁面字碼不變，才能改用這次的字型。
+        """
+        chars = set()
+        for data_row in self.data:
+            for label_id in self.label_ids:
+                chars.update(data_row.get(label_id, ""))
+        for _, new in self.replacements:
+            chars.update(new)
+        return old_order + "".join(sorted(chars.difference(old_order)))
 
     def draw_text(self, canvas, text, x, y, font_size, direction, wrap_limit):
-        # ✅ 先設定字型
-        canvas.setFont(self.font_name, font_size)
-        # 🔸 自訂關鍵詞（可放在類別屬性 or 傳入參數）
-        keywords = ["金紙", "營業所", "店", "公司"]
+        """
+        一個標籤畫成一個文字物件（一組 BT…ET）：字型只設定一次，
+        換行、垂直逐字都用游標移動，不再每個字一個 drawString。
+        相同內容的標籤只產生一次文字片段，之後只換起點位置。
+        """
+        text_object = canvas.beginText(x, y)
+        code = _text_code(text_object)
+        if code is None:
+            self.write_text(text_object, text, font_size, direction, wrap_limit)
+        else:
+            key = (text, font_size, direction, wrap_limit)
+            fragment = self._text_fragments.get(key)
+            if fragment is None:
+                # 起點（Tm）之後的內容都是相對位置，換個起點就能重複使用
+                start = len(code)
+                self.write_text(text_object, text, font_size, direction, wrap_limit)
+                self._text_fragments[key] = code[start:]
+            else:
+                code.extend(fragment)
+        canvas.drawText(text_object)
+
+    def write_text(self, text_object, text, font_size, direction, wrap_limit):
+        """把標籤文字寫進文字物件（只用 reportlab 公開的方法）。"""
+        # ✅ 先設定字型；行距 = 字體大小，textLine 每次往下移一個字
+        text_object.setFont(self.font_name, font_size, leading=font_size)
 
         # 🔸 斷行處理：先關鍵詞，再字數
-        lines = self.split_text_by_keywords(text, wrap_limit, keywords)
-        total_lines = len(lines)
+        lines = self.split_text_by_keywords(text, wrap_limit)
 
         if direction == "垂直":
             for line_idx, line in enumerate(lines):
-                offset_x = -line_idx * font_size
-                for char_idx, char in enumerate(line):
-                    canvas.drawString(
-                        x + offset_x, 
-                        y - char_idx * font_size,   # 垂直堆疊
-                        char
-                    )
+                if line_idx:
+                    # 下一行：往左一個字、回到起點的高度
+                    text_object.moveCursor(-font_size, -len(lines[line_idx - 1]) * font_size)
+                for char in line:
+                    text_object.textLine(char)  # 垂直堆疊
         elif direction == "水平":
-            for line_idx, line in enumerate(lines):
-                canvas.drawString(
-                    x,
-                    y - line_idx * font_size,       # 每行往下
-                    line
-                )
+            for line in lines:
+                text_object.textLine(line)  # 每行往下
         else:
             # fallback: 不處理換行
-            canvas.drawString(x, y, text)
-    def split_text_by_keywords(self,text: str, wrap_limit: int, keywords: list[str]) -> list[str]:
-        segments = []
-        # 🔧 先做文字替換（特殊關鍵詞處理）
-        if "氏九玄七祖" in text:
-            text = text.replace("氏九玄七祖", "氏 九玄七祖")
-        remove_words = ["其他"]  # 你想刪掉的詞放這裡
-        for w in remove_words:
-            if w in text:
-                text = text.replace(w, "")
-        # 🔸 用正則先處理每一種關鍵詞邏輯
-        remaining = text
-
-        # 🔶 金紙：先處理一次性關鍵詞（金紙）
-        for keyword in keywords:
-            if keyword == "金紙":
-                match = re.search(f"(.*?){keyword}(.*)", remaining)
-                if match:
-                    before = match.group(1)
-                    after = keyword + match.group(2)
-                    if before.strip():
-                        segments.append(before)
-                    segments.append(after)
-                    remaining = ""
-                    break  # ✅ 金紙只處理一次，結束
-        if remaining:
-            segments.append(remaining)
-
-        # 🔶 再處理可多次出現的（營業所、店）
-        new_segments = []
-        for seg in segments:
-            # 對每個 segment 再拆：處理多次關鍵詞分割（保留關鍵詞）
-            parts = [seg]
-            for kw in ["營業所", "店", "公司"]:
-                temp = []
-                for part in parts:
-                    # 保留關鍵詞在句尾：使用 lookahead
-                    sub_parts = re.split(f"(?<={kw})", part)
-                    temp.extend([s for s in sub_parts if s])  # 去除空段
-                parts = temp
-            new_segments.extend(parts)
-
-        # 🔶 wrap_limit 分段
-        lines = []
-        for seg in new_segments:
-            seg = seg.strip()
-            for i in range(0, len(seg), wrap_limit):
-                lines.append(seg[i:i+wrap_limit])
-
-        return lines
+            text_object.textOut(text)
+
+    def split_text_by_keywords(self, text: str, wrap_limit: int) -> list[str]:
+        # 斷行規則見 break_lines；相同文字只計算一次
+        return list(break_lines(
+            text, wrap_limit,
+            self.once_keywords, self.split_keywords, self.remove_words, self.replacements,
+        ))
+
+    def compile_render_plan(self, labels, compute_offset_func):
+        """
+        把標籤（QGraphicsItem）的位置加上每一格的偏移量，換算成 PDF 座標，
+        連同字體大小、方向、斷行字數整理成 LabelPlan。
+        必須在 GUI 執行緒呼叫；匯出時只用這份純資料，背景執行緒、子行程都能安全使用。
+        """
+        if not self.pdf_path or not labels:
+            return []
+
+        mediabox = PdfReader(self.pdf_path).pages[0].mediabox
+        pdf_width = float(mediabox.width)
+        pdf_height = float(mediabox.height)
+        self.page_size = (pdf_width, pdf_height)
+        x_ratio = pdf_width / self.image_width
+        y_ratio = pdf_height / self.image_height
+
+        offsets = [
+            compute_offset_func(i, self.h_count, self.v_count, self.image_width, self.image_height)
+            for i in range(self.h_count * self.v_count)
+        ]
+        label_map = defaultdict(list)
+        for label_id, item in labels:
+            label_map[label_id].append(item)
+
+        plan = []
+        for label_id, item_list in label_map.items():
+            params = self.label_param_settings.get(label_id, {})
+            font_size = params.get("font_size") or 22
+            direction = params.get("direction", "水平")  # 預設垂直
+            wrap_limit = params.get("wrap_limit", 10)
+            for item in item_list:
+                pos = item.pos()
+                text_height = item.boundingRect().height()
+                slots = tuple(
+                    ((pos.x() + offset_x) * x_ratio, pdf_height - ((pos.y() + offset_y + text_height) * y_ratio))
+                    for offset_x, offset_y in offsets
+                )
+                plan.append(LabelPlan(label_id, slots, font_size, direction, wrap_limit))
+        return plan
 
     def export(self, output_path, progress_callback=None):
-        if not self.pdf_path or not self.labels:
+        if not self.pdf_path or not self.render_plan:
             print("⚠️ 沒有載入 PDF 或沒有標籤")
             return
 
         blocks_per_page = self.h_count * self.v_count
-        label_map = defaultdict(list)
-        for label_id, item in self.labels:
-            label_map[label_id].append(item)
 
         template = PdfReader(self.pdf_path)
         base_page = template.pages[0]
-        pdf_width = float(base_page.mediabox.width)
-        pdf_height = float(base_page.mediabox.height)
-        x_ratio = pdf_width / self.image_width
-        y_ratio = pdf_height / self.image_height
+        pdf_width, pdf_height = self.page_size
 
         writer = PdfWriter()
         total_pages = (len(self.data) + blocks_per_page - 1) // blocks_per_page
 
-        for page_num in range(total_pages):
-            packet = BytesIO()
-            c = canvas.Canvas(packet, pagesize=(pdf_width, pdf_height))
-            print(f"\n🧾 第 {page_num+1} 頁：")
-
-            for i in range(blocks_per_page):
-                data_index = page_num * blocks_per_page + i
-                if data_index >= len(self.data):
-                    break
-
-                data_row = self.data[data_index]
-                offset_x, offset_y = self.compute_offset_func(
-                    i, self.h_count, self.v_count, self.image_width, self.image_height
-                )
+        # 每頁的內容雜湊（只看標籤用到的欄位）；和上次輸出相同的頁面直接沿用舊 PDF
+        page_hashes = [
+            hash_values([
+                [data_row.get(label_id, "") for label_id in self.label_ids]
+                for data_row in self.page_rows(page_num)
+            ])
+            for page_num in range(total_pages)
+        ]
+        manifest = ExportManifest(
+            output_path + self.MANIFEST_SUFFIX,
+            hash_settings([self.pdf_path], **self.layout_signature()),
+            autosave_every=0,
+        )
+        old_pages = self.load_old_pages(output_path, manifest)
+        # 字型子集的字元順序：沿用舊頁面時接續上次的順序，舊頁面的字碼在新字型裡仍然正確
+        self.glyph_order = self.collect_glyph_order(manifest.extras.get("glyph_order", "") if old_pages else "")
+        template_ref = self.embed_template(writer, base_page) if self.shared_template else None
 
-                for label_id, item_list in label_map.items():
-                    label_text = data_row.get(label_id, "")
-                    if not label_text:
-                        continue
-
-                    for item in item_list:
-                        orig_pos = item.pos()
-                        new_pos = orig_pos + QPointF(offset_x, offset_y)
-                        text_height = item.boundingRect().height()
-                        font_size = item.font().pointSize()
-
-                        x_pdf = new_pos.x() * x_ratio
-                        y_pdf = pdf_height - ((new_pos.y() + text_height) * y_ratio)
-
-                        params = self.label_param_settings.get(label_id, {})
-                        font_size = params.get("font_size") or 22
-                        direction = params.get("direction", "水平")  # 預設垂直
-                        wrap_limit = params.get("wrap_limit", 10)
-                        self.draw_text(c, label_text, x_pdf, y_pdf, font_size, direction, wrap_limit)
-            # ✅ 每頁完成後更新進度
-            if progress_callback:
-                progress_callback(int((page_num + 1) / total_pages * 100))
-            print(f"[Debug] 寫入 canvas，label 數量: {len(label_map)}")
+        reused = [
+            page_num < len(old_pages) and manifest.entries.get(str(page_num)) == page_hashes[page_num]
+            for page_num in range(total_pages)
+        ]
+
+        new_pages = [page_num for page_num in range(total_pages) if not reused[page_num]]
+        if self.use_processes and should_use_processes(len(new_pages), min_rows=self.PROCESS_MIN_PAGES):
+            overlay_pages = self.render_pages_in_processes(new_pages, total_pages, progress_callback)
+        else:
+            overlay_pages = self.render_pages_in_thread(reused, progress_callback)
+        if len(overlay_pages) != len(new_pages):
+            raise RuntimeError("PDF Overlay 頁數與資料頁數不符")
 
-            c.save()
-            packet.seek(0)
-            overlay_pdf = PdfReader(packet)
-            if not overlay_pdf.pages:
-                print("⚠️ PDF Overlay 沒有頁面，跳過合併")
-                continue  # 或是 return，避免崩潰
+        # 有新畫的頁面時，沿用的舊頁面也改用這次的字型（字元只往後加，是上次字型的超集），
+        # 舊的字型子集沒有頁面引用，就不會寫進輸出檔
+        font_ref = overlay_pages[0]["/Resources"].raw_get("/Font") if overlay_pages else None
+        # 畫出模板的內容串流只有新畫的頁面需要
+        draw_ref = self.add_template_draw(writer) if template_ref and overlay_pages else None
+
+        # 依頁碼順序組合：沿用的舊頁面 / 文字頁（依序對應 overlay 的每一頁）
+        overlay_iter = iter(overlay_pages)
+        for page_num in range(total_pages):
+            if reused[page_num]:
+                if template_ref:
+                    self.add_reused_page(writer, old_pages[page_num], template_ref, font_ref)
+                else:
+                    writer.add_page(old_pages[page_num])
+                continue
 
-            new_page = PageObject.create_blank_page(width=pdf_width, height=pdf_height)
-            new_page.merge_page(base_page)
-            new_page.merge_page(overlay_pdf.pages[0])
-            writer.add_page(new_page)
+            overlay_page = next(overlay_iter)
+            if template_ref:
+                self.add_overlay_page(writer, overlay_page, template_ref, draw_ref)
+            else:
+                new_page = PageObject.create_blank_page(width=pdf_width, height=pdf_height)
+                new_page.merge_page(base_page)
+                new_page.merge_page(overlay_page)
+                writer.add_page(new_page)
 
         try:
-            with open(output_path, "wb") as f:
+            # 先寫到暫存檔再取代，寫到一半失敗不會毀掉上次的輸出
+            tmp_path = f"{output_path}.tmp"
+            with open(tmp_path, "wb") as f:
                 writer.write(f)
+            os.replace(tmp_path, output_path)
+            manifest.entries = {str(i): page_hash for i, page_hash in enumerate(page_hashes)}
+            manifest.extras["glyph_order"] = self.glyph_order
+            manifest.save()
             print(f"\n✅ 轉換完成，輸出檔案：{output_path}")
             return True, output_path  # ✅ 成功回傳
         except Exception as e:
@@ -186,4 +372,169 @@ class PDFExporter:
             return False, str(e)  # ❌ 錯誤訊息回傳
         
 
+    def page_rows(self, page_num):
+        blocks_per_page = self.h_count * self.v_count
+        return self.data[page_num * blocks_per_page:(page_num + 1) * blocks_per_page]
+
+    def draw_page(self, c, rows):
+        """在 canvas 畫一頁的文字：rows[i] 是第 i 格的資料。"""
+        for i, data_row in enumerate(rows):
+            for label in self.render_plan:
+                label_text = data_row.get(label.label_id, "")
+                if not label_text:
+                    continue
+                x_pdf, y_pdf = label.slots[i]
+                self.draw_text(c, label_text, x_pdf, y_pdf, label.font_size, label.direction, label.wrap_limit)
+        c.showPage()
 
+    def render_overlay(self, pages):
+        """把多頁的文字畫在同一個 canvas，回傳 PDF 內容（每個 pages 項目一頁）。"""
+        packet = BytesIO()
+        c = self.new_canvas(packet)
+        for rows in pages:
+            self.draw_page(c, rows)
+        c.save()
+        return packet.getvalue()
+
+    def render_pages_in_thread(self, reused, progress_callback=None):
+        """
+        需要重新產生的頁面全部畫在同一個多頁 canvas：
+        字型子集整份只嵌入一次，也只需要存檔、解析一次。
+        """
+        total_pages = len(reused)
+        packet = BytesIO()
+        c = self.new_canvas(packet)
+        for page_num in range(total_pages):
+            if not reused[page_num]:
+                print(f"\n🧾 第 {page_num+1} 頁：")
+                self.draw_page(c, self.page_rows(page_num))
+                print(f"[Debug] 寫入 canvas，label 數量: {len(self.label_ids)}")
+            # ✅ 每頁完成後更新進度
+            if progress_callback:
+                progress_callback(int((page_num + 1) / total_pages * 100))
+
+        if all(reused):
+            return []
+        c.save()
+        return self.rendered_pages(packet.getvalue())
+
+    def render_pages_in_processes(self, page_nums, total_pages, progress_callback=None):
+        """
+        頁面分批交給多個子行程，各自畫成一份多頁 PDF 片段，依頁碼順序解析後接起來。
+        子行程只拿到不含資料的 exporter（版面已編譯好），每批的資料隨批次傳送。
+        每個片段都依同一份 glyph_order 編碼（見 prime_font），所有頁面改用第一個片段的字型，
+        其他片段各自嵌入的字型子集不會寫進輸出檔。
+        """
+        workers = default_worker_count()
+        chunk_size = max(10, min(100, len(page_nums) // (workers * 4)))
+        renderer = copy(self)
+        renderer.data = []
+        renderer._text_fragments = {}
+
+        overlay_pages = []
+        done = total_pages - len(page_nums)  # 沿用的頁面直接算完成
+        fragments = process_map(
+            render_pdf_overlay_chunk,
+            ([self.page_rows(page_num) for page_num in chunk] for chunk in chunked(page_nums, chunk_size)),
+            initializer=init_pdf_renderer,
+            initargs=(renderer,),
+            max_workers=workers,
+        )
+        font_ref = None
+        for fragment in fragments:
+            pages = self.rendered_pages(fragment)
+            for page in pages:
+                resources = page["/Resources"].get_object()
+                if font_ref is None:
+                    font_ref = resources.raw_get("/Font")
+                else:
+                    resources[NameObject("/Font")] = font_ref
+            overlay_pages.extend(pages)
+            done += len(pages)
+            print(f"🧾 已完成 {done}/{total_pages} 頁")
+            if progress_callback:
+                progress_callback(int(done / total_pages * 100))
+        return overlay_pages
+
+    def layout_signature(self):
+        """影響輸出外觀的所有設定（標籤位置、參數、切割數…），任何一項改變就整份重新產生。"""
+        return {
+            "plan": self.render_plan,
+            "grid": [self.h_count, self.v_count, self.image_width, self.image_height],
+            "font": self.font_name,
+            "shared_template": self.shared_template,
+            "line_break": [self.once_keywords, self.split_keywords, self.remove_words, self.replacements],
+        }
+
+    def embed_template(self, writer, base_page):
+        """把模板頁放進輸出檔一次，做成 form XObject，回傳參照；所有頁面共用這個物件。"""
+        contents = base_page.get_contents()
+        form = StreamObject()
+        form.set_data(contents.get_data() if contents is not None else b"")
+        form.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): ArrayObject([FloatObject(v) for v in base_page.mediabox]),
+        })
+        resources = base_page.get("/Resources")
+        if resources is not None:
+            form[NameObject("/Resources")] = resources.get_object().clone(writer)
+        return _add_pdf_object(writer, form.flate_encode())
+
+    def add_template_draw(self, writer):
+        """畫出共用模板的內容串流（新畫的文字頁共用），回傳參照。"""
+        draw = StreamObject()
+        draw.set_data(f"q {self.TEMPLATE_XOBJECT_NAME} Do Q\n".encode("ascii"))
+        return _add_pdf_object(writer, draw)
+
+    def add_reused_page(self, writer, old_page, template_ref, font_ref=None):
+        """
+        沿用上次輸出的頁面，但改為引用這次的共用模板：
+        複製頁面時不帶舊的模板 XObject，模板在輸出檔裡才不會每次增加一份。
+        有 font_ref 時字型也改用這次的字型，舊的字型子集不再寫進輸出檔。
+        """
+        page = writer.add_page(old_page, excluded_keys=("/Resources",))
+        resources = DictionaryObject()
+        for key, value in old_page[NameObject("/Resources")].get_object().items():
+            if key == "/XObject":
+                xobjects = DictionaryObject({
+                    NameObject(name): ref.clone(writer)
+                    for name, ref in value.get_object().items()
+                    if name != self.TEMPLATE_XOBJECT_NAME
+                })
+                xobjects[NameObject(self.TEMPLATE_XOBJECT_NAME)] = template_ref
+                resources[NameObject(key)] = xobjects
+            elif key == "/Font" and font_ref is not None:
+                resources[NameObject(key)] = font_ref.clone(writer)
+            else:
+                resources[NameObject(key)] = value.clone(writer)
+        page[NameObject("/Resources")] = resources
+        return page
+
+    def add_overlay_page(self, writer, overlay_page, template_ref, draw_ref):
+        """文字頁直接當輸出頁，資源加上共用模板，內容最前面先畫模板（與合併後的疊放順序相同）。"""
+        page = writer.add_page(overlay_page)
+
+        resources = page[NameObject("/Resources")].get_object()
+        xobjects = resources.get("/XObject")
+        if xobjects is None:
+            xobjects = resources[NameObject("/XObject")] = DictionaryObject()
+        xobjects.get_object()[NameObject(self.TEMPLATE_XOBJECT_NAME)] = template_ref
+
+        contents = page[NameObject("/Contents")].get_object()
+        if isinstance(contents, ArrayObject):
+            contents.insert(0, draw_ref)
+        else:
+            page[NameObject("/Contents")] = ArrayObject([draw_ref, page.raw_get("/Contents")])
+        return page
+
+    def load_old_pages(self, output_path, manifest):
+        """上次輸出的頁面；紀錄不存在、設定已改變或沒有字元順序（舊版紀錄）時回傳空 list。"""
+        if not manifest.entries or "glyph_order" not in manifest.extras or not os.path.exists(output_path):
+            return []
+        try:
+            old_pages = list(PdfReader(output_path).pages)
+        except Exception as e:
+            print(f"⚠️ 無法讀取上次的輸出檔，全部重新產生：{e}")
+            return []
+        return old_pages if len(old_pages) >= len(manifest.entries) else []
@@ -0,0 +1,91 @@
+# ✅ write_behind.py
+# 背景寫檔：轉換執行緒只負責產生內容，寫入磁碟交給專用的寫檔執行緒
+import os
+import queue
+import threading
+
+__all__ = [
+    "WriteBehindQueue",
+    "write_file_atomic",
+]
+
+_STOP = object()
+
+
+def write_file_atomic(path, data):
+    """先寫到暫存檔再改名，中途失敗不會留下寫一半的檔案。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+class WriteBehindQueue:
+    """
+    轉換執行緒把產生好的內容（或任何寫入動作）交給這裡，由寫檔執行緒依序執行，
+    CPU 轉換與磁碟 I/O 同時進行；輸出到隨身碟、網路磁碟時差別最明顯。
+    - 佇列有上限：寫檔跟不上時 submit() 會等待，記憶體不會無限制增加
+    - 動作依送出順序執行，可以在寫檔之後接著送出「標記完成」之類的動作
+    - 寫檔執行緒發生錯誤後，其餘動作都不再執行，下一次 submit() / close() 會丟出同一個例外
+    """
+
+    def __init__(self, max_pending=16):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None or self._aborted:
+                continue  # 繼續取出，送出端才不會卡在已滿的佇列
+            func, args = item
+            try:
+                func(*args)
+            except BaseException as e:
+                self._error = e
+
+    def submit(self, func, *args):
+        """排入一個動作 func(*args)；佇列已滿時等待。"""
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise RuntimeError("寫檔佇列已經關閉")
+        self._queue.put((func, args))
+
+    def write_file(self, path, data):
+        self.submit(write_file_atomic, path, data)
+
+    def close(self):
+        """等待所有動作完成；寫檔發生過錯誤時丟出。"""
+        self._stop()
+        self._raise_error()
+
+    def abort(self):
+        """放棄尚未執行的動作（已經在寫的那一個會寫完）。"""
+        self._aborted = True
+        self._stop()
+
+    def _stop(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -73,6 +73,9 @@ class MainWindow(QWidget):
 
 if __name__ == "__main__":
     import sys
+    import multiprocessing
+    # 封裝成 exe 後子行程（多行程轉換）需要這行，否則會重複開啟主視窗
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
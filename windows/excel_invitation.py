@@ -4,8 +4,6 @@ from PyQt6.QtWidgets import (
     QLineEdit, QHBoxLayout,  QMessageBox,QProgressBar
 )
 from core.base_windows import BaseFuncWindow
-from core.conversion_utils import read_data_auto
-
 from core.kai_thread_pool import WordExportWorker  # 假設你放這邊
 
 class ExcelToInvitationWindow(BaseFuncWindow):
@@ -74,6 +72,12 @@ class ExcelToInvitationWindow(BaseFuncWindow):
         self.limit_rows_combo = add_labeled_combobox(
             "筆數選擇：", ["200", "400", "600","800","1000","2000","4000", "全部"], default_index=0
         )
+        # 不壓縮：檔案較大，但大量輸出時寫檔較快
+        self.compress_combo = add_labeled_combobox("輸出檔案：", ["壓縮", "不壓縮"], default_index=0)
+        # 單一壓縮檔：全部召請文放進一個 zip（附 manifest.csv），不產生上千個小檔案
+        self.output_mode_combo = add_labeled_combobox("輸出方式：", ["個別檔案", "單一壓縮檔"], default_index=0)
+        # 樣式：字型大小寫成具名樣式，每個格子 / 文字只引用樣式，檔案較小、開啟較快
+        self.format_mode_combo = add_labeled_combobox("格式方式：", ["直接格式", "樣式"], default_index=0)
 
         self.btn_run = QPushButton("執行轉換")
         self.btn_run.setFixedSize(200, 40)
@@ -107,10 +111,6 @@ class ExcelToInvitationWindow(BaseFuncWindow):
             limit_text = self.limit_rows_combo.currentText()
             limit_rows = None if limit_text == "全部" else int(limit_text)
 
-            # 計算有效筆數並設定進度條最大值
-            max_progress = self.count_valid_rows(self.excel_path, required_cols, limit_rows)
-            self.progress_bar.setMaximum(max_progress)
-
             font_size_rules = [
                 (8, int(self.font_size_1.currentText())),
                 (20, int(self.font_size_2.currentText())),
@@ -125,7 +125,13 @@ class ExcelToInvitationWindow(BaseFuncWindow):
                 optional_cols=optional_cols,
                 font_size_rules=font_size_rules,
                 limit_rows=limit_rows,
+                store_only=self.compress_combo.currentText() == "不壓縮",
+                output_mode="archive" if self.output_mode_combo.currentText() == "單一壓縮檔" else "files",
+                is_closing_getter=lambda: self.is_closing,
+                use_styles=self.format_mode_combo.currentText() == "樣式",
             )
+            # 有效筆數在背景計算，算好後由 worker 設定進度條最大值
+            worker.signals.progress_max.connect(self.progress_bar.setMaximum)
             worker.signals.progress.connect(self.progress_bar.setValue)
             worker.signals.finished.connect(self.export_done)
 
@@ -136,16 +142,6 @@ class ExcelToInvitationWindow(BaseFuncWindow):
             self.btn_run.setEnabled(True)
             self.btn_run.setText("轉換")
 
-    def count_valid_rows(self, excel_path, required_cols, limit_rows):
-        import pandas as pd
-        df = read_data_auto(excel_path).fillna('')
-        if limit_rows:
-            df = df.head(limit_rows)
-        col_letter_map = {chr(65+i): name for i, name in enumerate(df.columns)}
-        valid_rows = [row for idx, row in df.iterrows() if all(str(row[col_letter_map[c]]) for c in required_cols)]
-        return len(valid_rows)
-
-
     def export_done(self, success, message):
         self.btn_run.setEnabled(True)
         self.btn_run.setText("轉換")
@@ -15,7 +15,6 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import mm
 from pypdf import PdfReader, PdfWriter, PageObject
 from PIL import Image
-from collections import defaultdict
 
 from .gold_ui_parts import (
     build_top_toolbar,
@@ -24,10 +23,9 @@ from .gold_ui_parts import (
 )
 from modules.pdf_viewer import PDFViewer
 from modules.label_manager import LabelManager
-from core.conversion_utils import (
-    read_data_auto,)
 from core.pdf_exporter import PDFExporter
-from core.kai_thread_pool import ExportWorker
+from core.kai_thread_pool import GoldPaperExportWorker
+from core.base_windows import ExcelPrefetchMixin
 from PyQt6.QtCore import  QThreadPool
 
 
@@ -40,7 +38,9 @@ font_path = os.path.join(current_dir, "..", "core", "Iansui-Regular.ttf")
 font_path = os.path.normpath(font_path)
 pdfmetrics.registerFont(TTFont("Iansui", font_path))
 
-class GoldPaperSealTransferWindow(QWidget):
+class GoldPaperSealTransferWindow(ExcelPrefetchMixin, QWidget):
+    excel_name_limit = 18  # 按鈕上的檔名限制文字長度
+
     def __init__(self, title="Excel 轉 PDF 可視化工具"):
         super().__init__()
         self.setWindowTitle(title)
@@ -149,13 +149,15 @@ class GoldPaperSealTransferWindow(QWidget):
         self.label_manager.labels.clear()  # 清除標籤清單
     
 
+    def excel_button(self):
+        return self.btn_select_exl
+
     def select_excel_file(self):
         path, _ = QFileDialog.getOpenFileName(self, "選擇 Excel 檔案", "", "Excel 檔案 (*.xls *.xlsx)")
         if path:
-            self.excel_path = path
-            filename = os.path.basename(path)
-            self.btn_select_exl.setText(f"Excel: {filename[:18]}")  # 限制文字長度
             self.btn_select_exl.setMaximumWidth(280)
+            # 選好檔案就在背景解析，按下匯出時直接命中快取
+            self.start_excel_prefetch(path)
 
     def load_pdf_preview(self):
         if not self.pdf_path:
@@ -258,36 +260,14 @@ class GoldPaperSealTransferWindow(QWidget):
             QMessageBox.warning(self, "警告", "⚠️ 請選擇 Excel 檔案。")
             return
 
-        self.setEnabled(False)
-        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
-        self.btn_export.setText("處理試算表中...")
-
-        data_list, error_msg = self.get_excel_data()
+        # 讀取範圍只在這裡從 UI 取得，實際讀檔交給背景執行緒
+        read_settings, error_msg = self.collect_excel_read_settings()
         if error_msg:
             QMessageBox.warning(self, "警告", f"⚠️ Excel 資料錯誤：{error_msg}")
-            self.setEnabled(True)
-            QApplication.restoreOverrideCursor()
-            self.btn_export.setText("執行轉換")
             return
 
-        label_map = defaultdict(list)
-        for label_id, item in self.label_manager.labels:
-            label_map[label_id].append(item)
-
-        missing_labels = []
-        for label_id in label_map.keys():
-            if not any(label_id in data_row and data_row[label_id] for data_row in data_list):
-                missing_labels.append(label_id)
-
-        if missing_labels:
-            QMessageBox.warning(
-                self,
-                "資料缺失警告",
-                f"資料中找不到標籤欄位：{', '.join(missing_labels)}，請檢查 Excel 資料或標籤設定。"
-            )
-            self.setEnabled(True)
-            QApplication.restoreOverrideCursor()
-            self.btn_export.setText("執行轉換")
+        output_path, _ = QFileDialog.getSaveFileName(self, "儲存 PDF", "output.pdf", "PDF Files (*.pdf)")
+        if not output_path:
             return
 
         label_param_settings = self.collect_label_param_settings()
@@ -299,29 +279,40 @@ class GoldPaperSealTransferWindow(QWidget):
             h_count=int(self.combo_h_split.currentText()),
             v_count=int(self.combo_v_split.currentText()),
             font_path=font_path,
-            data=data_list,
+            data=[],  # 資料由 worker 讀完、檢查後再填入
             compute_offset_func=self.compute_label_offset,
             label_param_settings=label_param_settings,
         )
 
-        output_path, _ = QFileDialog.getSaveFileName(self, "儲存 PDF", "output.pdf", "PDF Files (*.pdf)")
-        if not output_path:
-            self.setEnabled(True)
-            QApplication.restoreOverrideCursor()
-            self.btn_export.setText("執行轉換")
-            return
-
-        self.btn_export.setText("轉換pdf中...")
+        self.setEnabled(False)
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        self.btn_export.setText("處理試算表中...")
         self.progress_bar.setValue(0)
 
-        # ✅ 建立 ExportWorker，掛上 progress 與 finished 事件
-        self.worker = ExportWorker(exporter, output_path)
+        # ✅ 讀取、展開、標籤檢查、產生 PDF 全部在 worker 執行，介面不會卡住
+        self.worker = GoldPaperExportWorker(
+            exporter,
+            output_path,
+            excel_path=self.excel_path,
+            label_ids=sorted({label_id for label_id, _ in self.label_manager.labels}),
+            **read_settings,
+        )
+        self.worker.signals.stage.connect(self.btn_export.setText)
         self.worker.signals.progress.connect(self.progress_bar.setValue)
+        self.worker.signals.invalid.connect(self.export_invalid)
         self.worker.signals.finished.connect(self.export_done)
 
         # ✅ 把 worker 丟給 thread pool 執行
         QThreadPool.globalInstance().start(self.worker)
 
+    def export_invalid(self, title, message):
+        QApplication.restoreOverrideCursor()
+        self.setEnabled(True)
+        self.btn_export.setEnabled(True)
+        self.btn_export.setText("執行轉換")
+        self.progress_bar.setValue(0)
+        QMessageBox.warning(self, title, message)
+
     def export_done(self, success, result):
         QApplication.restoreOverrideCursor()
         self.setEnabled(True)
@@ -352,95 +343,26 @@ class GoldPaperSealTransferWindow(QWidget):
 
         return label_param_settings
     
-    def get_excel_data(self):
-        try:
-            self.progress_bar.setValue(0)
-            self.btn_export.setEnabled(False)
-            self.btn_export.setText("處理試算表中...")
-            # 自訂函式讀取 Excel，並將 NaN 用空字串代替
-            df = read_data_auto(self.excel_path)
-            df = df.fillna('')
-
-            # 取得使用者設定
-            process_mode = self.combo_process_mode.currentText()
-            is_fixed = self.radio_mode_fixed.isChecked()
-
-            # 決定資料範圍
-            if is_fixed:
-                limit_text = self.combo_row_limit.currentText()
-                if limit_text == "全部":
-                    # 「全部」但跳過第 0 列（標題）
-                    df_filtered = df.iloc[:]
-                else:
-                    limit = int(limit_text)
-                    df_filtered = df.iloc[:limit]
-            else:
-                start = self.spin_row_start.value() # index 從 0 開始
-                end = self.spin_row_end.value()
-                # ✅ 防呆檢查：start 至少從 1 開始
-                if start <= 0 or end < start or end > len(df):
-                    return [], f"自訂範圍不合法：從 {start} 到 {end}，但資料總筆數為 {len(df)}"
-
-
-                df_filtered = df.iloc[start-1:end]
-
-            # 建立欄位字母（A,B,C...）對應實際欄位名稱的字典
-            # 這樣能確保對應準確且不受欄位順序影響
-            col_letter_map = {chr(65+i): name for i, name in enumerate(df.columns)}
-            result_list = []
-            for _, row in df_filtered.iterrows():
-                result = {k: str(row[v]) for k, v in col_letter_map.items()}
-                result_list.append(result)
-
-
-            # 如果是金紙封條模式，就展開處理
-            if process_mode == "金紙封條":
-                result_list = self.expand_goldpaper_records(result_list,progress_callback=self.progress_bar.setValue)
-            return result_list, ""
-
-        except Exception as e:
-            return [], f"讀取 Excel 發生錯誤：{e}"
-        
-        finally:
-            print("讀取 Excel 檔案完成")
-
-
-    def expand_goldpaper_records(self, data_list, progress_callback=None):
-        expanded = []
-        gold_keys = list("FGHIJK")
-        total = len(data_list)
-
-        for idx, row in enumerate(data_list):
-            b_val = row["B"]
-            base_row = {k: row[k] for k in row if k not in gold_keys}
-            count = 0
-            for key in gold_keys:
-                content = row.get(key, "").strip()
-                if not content:
-                    break
-                if "金紙" in content:
-                    try:
-                        n = int(content.split("金紙")[1].split("份")[0].strip())
-                    except:
-                        n = 1
-                    n=n+1
-                    for i in range(n):
-                        new_row = base_row.copy()
-                        new_row["B"] = b_val if i == 0 and count == 0 else f"{b_val}-{count + i }"
-                        new_row.update({k: "" for k in gold_keys})
-                        new_row["F"] = content.replace(f"金紙{n-1}份", "金紙1份")
-                        expanded.append(new_row)
-                    count += n
-                else:
-                    new_row = base_row.copy()
-                    new_row["B"] = b_val if count == 0 else f"{b_val}-{count}"
-                    new_row.update({k: "" for k in gold_keys})
-                    new_row["F"] = content
-                    expanded.append(new_row)
-                    count += 1
-
-            # 💡 更新進度
-            if progress_callback:
-                progress_callback(int((idx + 1) / total * 100))
-
-        return expanded
+    def collect_excel_read_settings(self):
+        """
+        從 UI 取得試算表讀取範圍與處理模式，回傳 (設定, 錯誤訊息)。
+        設定直接作為 GoldPaperExportWorker 的參數。
+        """
+        process_mode = self.combo_process_mode.currentText()
+        if self.radio_mode_fixed.isChecked():
+            limit_text = self.combo_row_limit.currentText()
+            start, stop = 0, (None if limit_text == "全部" else int(limit_text))
+        else:
+            start = self.spin_row_start.value() # index 從 0 開始
+            end = self.spin_row_end.value()
+            # ✅ 防呆檢查：start 至少從 1 開始
+            if start <= 0 or end < start:
+                return {}, f"自訂範圍不合法：從 {start} 到 {end}"
+            start, stop = start - 1, end
+
+        return {
+            "start": start,
+            "stop": stop,
+            "custom_range": not self.radio_mode_fixed.isChecked(),
+            "expand_gold": process_mode == "金紙封條",
+        }, ""
@@ -9,11 +9,9 @@ from PyQt6.QtWidgets import (
 from core.base_windows import BaseFuncWindow
 from core.kai_thread_pool import WordBatchExportWorker
 from core.conversion_utils import (
-    read_data_auto,
     duplicate_table_and_insert,
     map_all_placeholders,
     fill_data_to_table_v2,
-    get_dynamic_font_size_func
 )
 
 class InvitationTransferWindow(BaseFuncWindow):
@@ -83,6 +81,10 @@ class InvitationTransferWindow(BaseFuncWindow):
         self.limit_rows_combo = add_labeled_combobox(
             "筆數選擇：", ["15","30","45","90","200", "400", "600", "800", "1000", "2000", "4000", "全部"], 2
         )
+        # 分冊：每冊固定頁數，各冊同時產生，檔案較小、Word 開啟較快
+        self.volume_pages_combo = add_labeled_combobox("每冊頁數：", ["不分冊", "20", "50", "100"], 0)
+        # 樣式：字型大小寫成具名樣式，每個格子 / 文字只引用樣式，檔案較小、開啟較快
+        self.format_mode_combo = add_labeled_combobox("格式方式：", ["直接格式", "樣式"], 0)
 
         # 執行按鈕
         self.btn_run = QPushButton("執行轉換")
@@ -96,11 +98,11 @@ class InvitationTransferWindow(BaseFuncWindow):
         self.progress_bar.setValue(0)
         layout.addWidget(self.progress_bar, alignment=Qt.AlignmentFlag.AlignCenter)
 
-    def get_font_size_func_from_ui(self):
+    def get_font_sizes_from_ui(self):
         size_1 = int(self.font_size_1.currentText())
         size_2 = int(self.font_size_2.currentText())
         size_3 = int(self.font_size_3.currentText())
-        return get_dynamic_font_size_func(size_1, size_2, size_3)
+        return size_1, size_2, size_3
 
 
     def run_conversion(self):
@@ -121,8 +123,8 @@ class InvitationTransferWindow(BaseFuncWindow):
             if not required_text:
                 raise ValueError("請輸入必須欄位。")
 
-            if not all(col.strip().isalpha() and len(col.strip()) == 1 for col in required_text.split(",")):
-                raise ValueError("必須欄位必須為英文單一字母，以逗號分隔。")
+            if not all(col.strip().isascii() and col.strip().isalpha() for col in required_text.split(",")):
+                raise ValueError("必須欄位必須為英文欄位字母（例如 B 或 AA），以逗號分隔。")
 
             required_cols = [c.strip().upper() for c in required_text.split(",") if c.strip()]
             optional_text = self.input_optional.text().strip()
@@ -131,18 +133,6 @@ class InvitationTransferWindow(BaseFuncWindow):
             limit_text = self.limit_rows_combo.currentText()
             limit_rows = None if limit_text == "全部" else int(limit_text)
 
-            # 先用 pandas 讀一次 Excel，取得最大進度，設定進度條最大值
-            df = read_data_auto(self.excel_path).fillna('')
-            if limit_rows:
-                df = df.head(limit_rows)
-            total_rows = len(df)
-            self.progress_bar.setMaximum(total_rows)
-
-            col_letter_map = {chr(65+i): name for i, name in enumerate(df.columns)}
-            for col in required_cols + optional_cols:
-                if col not in col_letter_map:
-                    raise ValueError(f"欄位 {col} 不存在於讀取的資料中。")
-
             # 啟動執行緒工作者
             worker = WordBatchExportWorker(
                 excel_path=self.excel_path,
@@ -152,9 +142,13 @@ class InvitationTransferWindow(BaseFuncWindow):
                 optional_cols=optional_cols,
                 limit_rows=limit_rows,
                 is_closing_getter=lambda: self.is_closing,
-                get_font_size_func=self.get_font_size_func_from_ui,
+                font_sizes=self.get_font_sizes_from_ui(),
+                pages_per_volume=None if self.volume_pages_combo.currentText() == "不分冊" else int(self.volume_pages_combo.currentText()),
+                use_styles=self.format_mode_combo.currentText() == "樣式",
             )
 
+            # 讀檔與篩選都在 worker 裡，篩完後由 worker 設定進度條最大值
+            worker.signals.progress_max.connect(self.progress_bar.setMaximum)
             worker.signals.progress.connect(self.progress_bar.setValue)
             worker.signals.finished.connect(self.export_done)
 